@@ -1,52 +1,204 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 
+import file_manager
 
-def averaged_curve(data, selected_curves):
-    df_merged = pd.DataFrame()  # Creating empty DataFrame to concat selected curves
+WINDOW_SIZE = 20
+# rolling: concatenate all repetitions, sort by depth and average window_size neighbouring points
+# grid: interpolate every repetition onto a shared depth grid and average across repetitions
+MERGE_MODES = ('rolling', 'grid')
+
+
+def averaged_curve(data, selected_curves, window_size=WINDOW_SIZE, rounding=True, schema=None, mode='rolling'):
+    if schema is None:
+        schema = file_manager.ExportSchema(data)
 
     soon_merged_array_pd = []
     soon_merged_array_hardness = []
 
     for i in range(len(selected_curves)):
-        x_name = f"X_{selected_curves[i]}_Pd_[nm]"
-        y_name = f"Y_{selected_curves[i]}_Hardness (H)_[MPa]"
-        soon_merged_array_pd.append(data[x_name])
-        soon_merged_array_hardness.append(data[y_name])
-
-    df_merged['Pd'] = pd.concat(soon_merged_array_pd)
-    df_merged['Hardness'] = pd.concat(soon_merged_array_hardness)
-
-    df_merged.sort_values(by=['Pd'], axis=0, inplace=True)
-    df_merged.reset_index(level=None, drop=True, inplace=True, col_level=0, col_fill='')
-
-    x = df_merged['Pd']
-    y = df_merged['Hardness']
-
-    i = 0
-    lim = len(x)
-    window_size = 20
-
-    # Initialize an empty list to store moving averages
-    moving_avgX = []
-    moving_avgY = []
-    moving_stdY = []
-
-    # Loop through the array t o
-    # consider every window of size 3
-    while i < lim - window_size + 1:
-        # Calculate the average of current window
-        window_avg = round(np.sum(y[i:i + window_size]) / window_size, 2)  # i, i+1, ... i+window_size-1
-        window_std = round(np.std(y[i:i + window_size]))
-
-        # Store the average of current
-        # window in moving average list
-        moving_avgY.append(window_avg)
-        moving_stdY.append(window_std)
-        moving_avgX.append(x[i] + window_size / 2)
-
-        # Shift window to right by one position
-        i += 1
-
-    return pd.DataFrame({'x': moving_avgX, 'mean': moving_avgY, 'std': moving_stdY})
+        soon_merged_array_pd.append(schema.curve_values(selected_curves[i], 'Pd', 'X'))
+        soon_merged_array_hardness.append(schema.curve_values(selected_curves[i], 'Hardness (H)', 'Y'))
+
+    return averaged_arrays(soon_merged_array_pd, soon_merged_array_hardness, window_size, rounding, mode)
+
+
+def averaged_arrays(pd_arrays, hardness_arrays, window_size=WINDOW_SIZE, rounding=True, mode='rolling'):
+    """averaged_curve of curves given as lists of depth and hardness arrays"""
+    if mode == 'grid':
+        return grid_merge(pd_arrays, hardness_arrays)
+    if mode != 'rolling':
+        raise ValueError(f"unknown merge mode {mode!r}, expected one of {', '.join(MERGE_MODES)}")
+
+    pd_array = np.concatenate(pd_arrays)
+    hardness_array = np.concatenate(hardness_arrays)
+
+    # same ordering as DataFrame.sort_values: sort valid depths, NaN rows go last
+    valid = ~np.isnan(pd_array)
+    valid_idx = np.flatnonzero(valid)
+    order = np.concatenate([valid_idx[np.argsort(pd_array[valid_idx])], np.flatnonzero(~valid)])
+
+    return rolling_statistics(pd_array[order], hardness_array[order], window_size, rounding)
+
+
+def rolling_statistics(x, y, window_size=WINDOW_SIZE, rounding=True):
+    """return moving average and standard deviation of every full window of y as a x/mean/std DataFrame.
+    windows are evaluated at once from cumulative sums, NaN values are skipped like pandas does"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(y) < window_size:
+        return pd.DataFrame({'x': [], 'mean': [], 'std': []})
+
+    valid = ~np.isnan(y)
+    # shifting by the mean keeps the sum of squares small and the variance free of cancellation
+    shift = y[valid].mean() if valid.any() else 0.0
+    centered = np.where(valid, y - shift, 0.0)
+
+    window_count = _window_sum(valid.astype(float), window_size)
+    window_sum = _window_sum(centered, window_size)
+    window_sum_sq = _window_sum(centered * centered, window_size)
+
+    # np.sum over a Series skips NaN but the average is still divided by the full window
+    window_avg = (window_sum + shift * window_count) / window_size
+    with np.errstate(invalid='ignore', divide='ignore'):
+        window_mean = window_sum / window_count
+        window_var = np.maximum(window_sum_sq / window_count - window_mean * window_mean, 0.0)
+    window_std = np.sqrt(window_var)
+
+    if rounding:
+        # the sums differ from a per window np.sum in the last bits, so a mean that sits on a rounding
+        # boundary can round 0.01 apart from the old loop (window 8821 of the 68 curve srs_mg_gd merge,
+        # 630.03 instead of 630.02, every other window of the example files matches exactly)
+        window_avg = np.round(window_avg, 2)
+        window_std = np.round(window_std)
+        if not np.isnan(window_std).any():
+            window_std = window_std.astype(np.int64)
+
+    moving_avgX = x[:len(window_avg)] + window_size / 2
+
+    return pd.DataFrame({'x': moving_avgX, 'mean': window_avg, 'std': window_std})
+
+
+def grid_merge(pd_arrays, hardness_arrays, grid=None):
+    """interpolate every repetition onto one shared depth grid and return the mean, sample std and number of
+    repetitions at every grid point as a x/mean/std/count DataFrame. a repetition only counts inside its own
+    depth range. the default grid spans all repetitions with as many points as the longest one"""
+    curves = [_depth_sorted(depth, hardness) for depth, hardness in zip(pd_arrays, hardness_arrays)]
+    curves = [(depth, hardness) for depth, hardness in curves if len(depth) > 1]
+    if grid is None:
+        if not curves:
+            return pd.DataFrame({'x': [], 'mean': [], 'std': [], 'count': []})
+        grid = np.linspace(min(depth[0] for depth, _ in curves), max(depth[-1] for depth, _ in curves),
+                           max(len(depth) for depth, _ in curves))
+    grid = np.asarray(grid, dtype=float)
+
+    values = _interp_curves(curves, grid)
+    count = np.isfinite(values).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(values, axis=0) / count
+        squares = np.nansum((values - mean) ** 2, axis=0)
+        std = np.where(count > 1, np.sqrt(squares / (count - 1)), np.nan)
+    return pd.DataFrame({'x': grid, 'mean': mean, 'std': std, 'count': count})
+
+
+def repetitions_at_depths(pd_arrays, hardness_arrays, depths):
+    """return the hardness of every repetition linearly interpolated at every depth as a (repetitions, depths)
+    array, NaN outside a repetition's depth range"""
+    return _interp_curves([_depth_sorted(depth, hardness) for depth, hardness in zip(pd_arrays, hardness_arrays)],
+                          np.atleast_1d(np.asarray(depths, dtype=float)))
+
+
+def _interp_curves(curves, grid):
+    values = np.full((len(curves), len(grid)), np.nan)
+    for i, (depth, hardness) in enumerate(curves):
+        if len(depth) > 1:
+            values[i] = np.interp(grid, depth, hardness, left=np.nan, right=np.nan)
+    return values
+
+
+def _depth_sorted(depth, hardness):
+    """depth and hardness of one curve without the points lacking a depth, sorted by depth"""
+    depth = np.asarray(depth, dtype=float)
+    hardness = np.asarray(hardness, dtype=float)
+    valid = np.isfinite(depth)
+    depth, hardness = depth[valid], hardness[valid]
+    if np.any(depth[1:] < depth[:-1]):
+        order = np.argsort(depth, kind='stable')
+        depth, hardness = depth[order], hardness[order]
+    return depth, hardness
+
+
+def _window_sum(values, window_size):
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    return cumulative[window_size:] - cumulative[:-window_size]
+
+
+def hardness_at_depths(merged_curve, depths, column='mean'):
+    """return the mean hardness (or another column) of a merged curve linearly interpolated at every depth,
+    NaN outside the curve"""
+    x = np.asarray(merged_curve['x'], dtype=float)
+    y = np.asarray(merged_curve[column], dtype=float)
+    valid = np.isfinite(x) & np.isfinite(y)
+    return np.interp(np.asarray(depths, dtype=float), x[valid], y[valid], left=np.nan, right=np.nan)
+
+
+def srs_profile(data, depths, grains=None, window_size=WINDOW_SIZE, schema=None, mode='rolling'):
+    """return strain rate sensitivity m(depth) of every (material, grain) of a srs export as a DataFrame.
+    all repetitions of each strain rate are merged with averaged_curve in the given mode, the merged hardness
+    is interpolated at every depth and log10(H) is fitted against log10(strain rate) for all depths at once"""
+    if schema is None:
+        schema = file_manager.ExportSchema(data)
+    depths = np.atleast_1d(np.asarray(depths, dtype=float))
+    if grains is not None:
+        grains = {str(grain) for grain in grains}
+
+    strain_rates = {}  # (material, grain) -> strain rates
+    for material, grain, strain_rate in schema.groups():
+        if strain_rate is None or (grains is not None and grain not in grains):
+            continue
+        strain_rates.setdefault((material, grain), []).append(strain_rate)
+
+    profiles = []
+    for (material, grain), rates in strain_rates.items():
+        hardness = np.array([hardness_at_depths(averaged_curve(data, schema.group_curves(material, grain, rate),
+                                                               window_size, schema=schema, mode=mode), depths)
+                             for rate in rates])
+        fit = loglog_fit(np.array(rates), hardness)
+        profiles.append(pd.DataFrame({'material': material, 'grain': grain, 'depth': depths, **fit}))
+
+    if not profiles:
+        return pd.DataFrame(columns=['material', 'grain', 'depth', 'm', 'm_stderr', 'intercept', 'r_squared',
+                                     'n_rates'])
+    return pd.concat(profiles, ignore_index=True)
+
+
+def loglog_fit(strain_rates, hardness):
+    """least squares fit of log10(hardness) against log10(strain_rates) for every column of hardness at once.
+    hardness is (strain rates, depths), NaN entries are left out of their column's fit.
+    returns slope m, its standard error, intercept, r_squared and the number of strain rates per column"""
+    x = np.log10(np.asarray(strain_rates, dtype=float))[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        y = np.log10(np.asarray(hardness, dtype=float))
+    weight = np.isfinite(y)
+    y = np.where(weight, y, 0.0)
+    x = np.broadcast_to(x, y.shape) * weight
+
+    n = weight.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_mean = x.sum(axis=0) / n
+        y_mean = y.sum(axis=0) / n
+        dx = (x - x_mean) * weight
+        dy = (y - y_mean) * weight
+        s_xx = (dx * dx).sum(axis=0)
+        s_yy = (dy * dy).sum(axis=0)
+        m = (dx * dy).sum(axis=0) / s_xx
+        intercept = y_mean - m * x_mean
+        residual = (dy - m * dx) * weight
+        ssr = (residual * residual).sum(axis=0)
+        m_stderr = np.sqrt(ssr / (n - 2) / s_xx)
+        r_squared = 1 - ssr / s_yy
+
+    m = np.where(n >= 2, m, np.nan)
+    m_stderr = np.where(n >= 3, m_stderr, np.nan)
+    return {'m': m, 'm_stderr': m_stderr, 'intercept': np.where(n >= 2, intercept, np.nan),
+            'r_squared': np.where(n >= 3, r_squared, np.nan), 'n_rates': n}
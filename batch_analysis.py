@@ -0,0 +1,132 @@
+import argparse
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import creep_analysis
+import profiling
+import srs_uncertainty
+
+DATA_FILE_SUFFIXES = ('_data', ' data')
+CURVE_FILE_SUFFIXES = ('', '_curve', ' curve')
+EXTENSIONS = ('.txt',)
+SUMMARY_COLUMNS = ['curve_file', 'data_file', 'case', 'status', 'm', 'm_low', 'm_high', 'n', 'n_low', 'n_high',
+                   'a', 'b', 'k', 's_value', 'er_value', 'fit_nfev', 'fit_time', 'error']
+BOOTSTRAP_SEED = 0  # fixed so that reruns give the same intervals
+
+
+def find_file_pairs(root):
+    """return (curve file, data file) pairs under root, e.g. HT_V_300mN.TXT with HT_V_300mN_data.TXT
+    or 'As-built sample curve.TXT' with 'As-built sample data.TXT'"""
+    pairs = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        lower_names = {name.lower(): name for name in file_names}
+        for file_name in sorted(file_names):
+            stem, extension = os.path.splitext(file_name)
+            if extension.lower() not in EXTENSIONS:
+                continue
+            for data_suffix in DATA_FILE_SUFFIXES:
+                if not stem.endswith(data_suffix):
+                    continue
+                base = stem[:-len(data_suffix)]
+                for curve_suffix in CURVE_FILE_SUFFIXES:
+                    curve_name = lower_names.get(f"{base}{curve_suffix}{extension}".lower())
+                    if curve_name is not None:
+                        pairs.append((os.path.join(dir_path, curve_name), os.path.join(dir_path, file_name)))
+                        break
+                break
+    return pairs
+
+
+def analyze_pair(pair):
+    """run the creep pipeline on one file pair and return one summary row per case"""
+    curve_file, data_file = pair
+    try:
+        with profiling.span('pair', curve_file=curve_file):
+            hardness_time_data, stiffness_data = creep_analysis.load_experiment(curve_file, data_file)
+            data_manager = creep_analysis.create_data_manager(hardness_time_data, stiffness_data)
+    except Exception as error:
+        return [summary_row(curve_file, data_file, None, 'failed', error=_format_error(error))]
+
+    try:
+        intervals = srs_uncertainty.case_intervals(data_manager, seed=BOOTSTRAP_SEED).set_index('case')
+        interval_error = ''
+    except Exception as error:
+        # m and n are still reported, only without their intervals
+        intervals = pd.DataFrame(columns=['m_low', 'm_high', 'n_low', 'n_high'])
+        interval_error = f"bootstrap failed: {_format_error(error)}"
+    rows = []
+    for case in data_manager.values():
+        row = summary_row(curve_file, data_file, case.name, case.status,
+                          s_value=case.s_value, er_value=case.er_value, error=case.error or '')
+        if case.ok:
+            row['error'] = interval_error
+            row['a'], row['b'], row['k'] = case.fitting_constants
+            row['fit_nfev'] = case.fit_info['nfev']
+            row['fit_time'] = case.fit_info['fit_time']
+            row['m'] = case.srs_m
+            row['n'] = 1 / case.srs_m
+            if case.name in intervals.index:
+                row.update(intervals.loc[case.name, ['m_low', 'm_high', 'n_low', 'n_high']])
+        rows.append(row)
+    return rows
+
+
+def summary_row(curve_file, data_file, case, status, **values):
+    row = {column: np.nan for column in SUMMARY_COLUMNS}
+    row.update(curve_file=curve_file, data_file=data_file, case=case, status=status, error='')
+    row.update(values)
+    return row
+
+
+def run_batch(root, workers=None):
+    """analyze every file pair under root on a process pool and return one summary table"""
+    pairs = find_file_pairs(root)
+    rows = []
+    if workers == 1:
+        results = map(analyze_pair, pairs)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(analyze_pair, pairs)
+    try:
+        for pair_rows in results:
+            rows.extend(pair_rows)
+    finally:
+        if workers != 1:
+            executor.shutdown()
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+def _format_error(error):
+    return ''.join(traceback.format_exception_only(type(error), error)).strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the creep analysis on every curve/data file pair in a directory.")
+    parser.add_argument('directory', help="directory searched recursively for <name>.TXT / <name>_data.TXT pairs")
+    parser.add_argument('-o', '--output', default='creep_summary.csv', help="summary table (.csv)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="number of worker processes")
+    parser.add_argument('--profile', default=None,
+                        help="time every stage and case in one process and write a Chrome trace (.json)")
+    args = parser.parse_args(argv)
+
+    if args.profile is None:
+        summary = run_batch(args.directory, args.jobs)
+    else:
+        with profiling.profile(args.profile) as profiler:
+            summary = run_batch(args.directory, workers=1)
+        print(profiler.summary())
+    summary.to_csv(args.output, index=False)
+
+    failed = (summary['status'] != 'ok').sum()
+    print(f"{len(summary)} cases from {summary['curve_file'].nunique()} files, {failed} failed -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import analyzer
+import creep_analysis
+import creep_results
+import file_manager
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'example_file')  # found from any directory
+SRS_FILE_PATH = os.path.join(EXAMPLE_DIR, 'srs_mg.TXT')
+CREEP_FILE_PATHS = (os.path.join(EXAMPLE_DIR, 'HT_V_100mN.TXT'), os.path.join(EXAMPLE_DIR, 'HT_V_100mN_data.TXT'))
+
+SCALES = (1, 10, 100)  # synthetic copies, every scale multiplies the number of curves or samples
+DEFAULT_SCALES = (1, 10)
+REPEAT = 5
+THRESHOLD = 0.25  # relative slowdown of the median flagged as a regression
+
+# setup(dataset) -> argument of run(argument), teardown(argument) after the run
+Benchmark = namedtuple('Benchmark', ['name', 'dataset', 'setup', 'run', 'teardown'], defaults=(None,))
+
+
+def scale_export(dataframe, curves=1, samples=1):
+    """synthetic export with curves times as many repetitions of every case and samples times as many points.
+    copies get repetition numbers after the last real one of their case, samples are linearly interpolated"""
+    schema = file_manager.ExportSchema(dataframe)
+    columns = [dataframe.columns[key.position] for key in schema.keys]
+    values = dataframe[columns].to_numpy(dtype=float)
+    if samples > 1:
+        rows = np.arange(len(values))
+        fine_rows = np.linspace(0, len(values) - 1, (len(values) - 1) * samples + 1)
+        values = np.column_stack([np.interp(fine_rows, rows[np.isfinite(column)], column[np.isfinite(column)])
+                                  if np.isfinite(column).any() else np.full(len(fine_rows), np.nan)
+                                  for column in values.T])
+
+    last_repetition = {}
+    for key in schema.keys:
+        case = key.curve.rsplit("_", 1)[0]
+        last_repetition[case] = max(last_repetition.get(case, 0), key.repetition)
+    labels = []
+    seen = {}
+    for copy in range(curves):
+        for key in schema.keys:
+            case = key.curve.rsplit("_", 1)[0]
+            repetition = key.repetition + copy * last_repetition[case]
+            label = f"{key.axis}_{case}_{repetition}_{key.quantity}_{key.unit}"
+            # repeated time columns get .1 like pandas gives them when reading an export
+            labels.append(f"{label}.{seen[label]}" if seen.get(label) else label)
+            seen[label] = seen.get(label, 0) + 1
+    return pd.DataFrame(np.tile(values, curves), columns=labels)
+
+
+def scale_parameters(stiffness_data, curves=1):
+    """O&P parameter table matching scale_export(curves=curves), copies get the measurement numbers of the copies"""
+    measurements = stiffness_data['Measurement'].astype(int)
+    last_measurement = measurements.groupby(stiffness_data['Group']).transform('max')
+    return pd.concat([stiffness_data.assign(Measurement=measurements + copy * last_measurement)
+                      for copy in range(curves)], ignore_index=True)
+
+
+def scale_parameters_for_samples(samples=1):
+    """create_data_manager parameters counted in points, scaled so denser curves are analysed like the originals"""
+    return {'hold_spacing': creep_analysis.HOLD_GRADIENT_SPACING * samples,
+            'step_size': creep_analysis.START_STEP_SIZE * samples,
+            'srs_fit_window': creep_analysis.SRS_FIT_WINDOW * samples}
+
+
+def load_datasets(scale, axis):
+    """example data scaled along 'curves' or 'samples'"""
+    factors = {'curves': scale, 'samples': 1} if axis == 'curves' else {'curves': 1, 'samples': scale}
+    srs_data = scale_export(file_manager.txt_to_df(SRS_FILE_PATH), **factors)
+    hardness_time_data, stiffness_data = creep_analysis.load_experiment(*CREEP_FILE_PATHS)
+    return {'srs': srs_data,
+            'creep': (scale_export(hardness_time_data, **factors), scale_parameters(stiffness_data, factors['curves']),
+                      scale_parameters_for_samples(factors['samples']))}
+
+
+def _srs_group_curves(data):
+    schema = file_manager.ExportSchema(data)
+    return data, schema.group_curves(*schema.groups()[0])
+
+
+def _creep_segments(datasets):
+    hardness_time_data, _, parameters = datasets
+    case = creep_analysis.get_exp_case(hardness_time_data)[0]
+    return creep_analysis.get_displacement_time_dataframe(hardness_time_data, case), parameters['hold_spacing']
+
+
+def _creep_before_fitting(datasets):
+    hardness_time_data, stiffness_data, parameters = datasets
+    data_manager = creep_results.CreepResults(creep_analysis.get_exp_case(hardness_time_data))
+    creep_analysis.raw_data_insert(hardness_time_data, data_manager)
+    parameter_table = file_manager.ParameterTable(stiffness_data)
+    creep_analysis.s_value_insert(parameter_table, data_manager)
+    creep_analysis.er_value_insert(parameter_table, data_manager)
+    creep_analysis.creep_data_insert(data_manager, parameters['hold_spacing'])
+    return data_manager
+
+
+def _write_export(data):
+    handle, file_path = tempfile.mkstemp(suffix='.TXT')
+    os.close(handle)
+    data.to_csv(file_path, sep='\t', index=False)
+    return file_path
+
+
+BENCHMARKS = [
+    Benchmark('averaged_curve', 'srs', _srs_group_curves, lambda args: analyzer.averaged_curve(*args)),
+    Benchmark('averaged_curve_grid', 'srs', _srs_group_curves, lambda args: analyzer.averaged_curve(*args, mode='grid')),
+    Benchmark('txt_to_df', 'srs', _write_export, lambda file_path: file_manager.txt_to_df(file_path, use_cache=False),
+              os.remove),
+    Benchmark('find_creep_start_end_idx', 'creep', _creep_segments,
+              lambda args: creep_analysis.find_creep_start_end_idx(*args)),
+    Benchmark('compute_creep_fitting', 'creep', _creep_before_fitting, creep_analysis.compute_creep_fitting),
+    Benchmark('create_data_manager', 'creep', lambda datasets: datasets,
+              lambda datasets: creep_analysis.create_data_manager(datasets[0], datasets[1], **datasets[2])),
+]
+
+
+def time_benchmark(benchmark, dataset, repeat=REPEAT):
+    """return seconds of every run, setup runs again before each one since runs may modify their argument"""
+    times = []
+    for _ in range(repeat):
+        argument = benchmark.setup(dataset)
+        try:
+            start = time.perf_counter()
+            benchmark.run(argument)
+            times.append(time.perf_counter() - start)
+        finally:
+            if benchmark.teardown is not None:
+                benchmark.teardown(argument)
+    return times
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, repeat=REPEAT, names=None, log=print):
+    """run every benchmark (or the given names) on every scale of curves and samples and return the results
+    as a json-ready dict, keyed by '<benchmark>[<axis>x<scale>]'"""
+    results = {}
+    for scale in scales:
+        for axis in (('curves',) if scale == 1 else ('curves', 'samples')):
+            datasets = load_datasets(scale, axis)
+            for benchmark in BENCHMARKS:
+                if names is not None and benchmark.name not in names:
+                    continue
+                key = f"{benchmark.name}[{axis}x{scale}]" if scale > 1 else f"{benchmark.name}[x1]"
+                times = time_benchmark(benchmark, datasets[benchmark.dataset], repeat)
+                results[key] = {'benchmark': benchmark.name, 'axis': axis, 'scale': scale, 'repeat': repeat,
+                                'min': min(times), 'median': statistics.median(times),
+                                'mean': statistics.fmean(times), 'times': times}
+                log(f"{key:45s} median {results[key]['median'] * 1e3:10.2f} ms  min {min(times) * 1e3:10.2f} ms")
+    return {'meta': _environment(), 'results': results}
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """return (key, baseline median, median, ratio) of every benchmark slower than baseline by more than threshold"""
+    regressions = []
+    for key, result in results['results'].items():
+        reference = baseline['results'].get(key)
+        if reference is None:
+            continue
+        ratio = result['median'] / reference['median']
+        if ratio > 1 + threshold:
+            regressions.append((key, reference['median'], result['median'], ratio))
+    return regressions
+
+
+def _environment():
+    return {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the analysis hot paths on the example files and "
+                                                 "synthetic scaled-up copies.")
+    parser.add_argument('-o', '--output', default='benchmark.json', help="results (.json)")
+    parser.add_argument('-b', '--baseline', default=None, help="earlier results (.json) to compare against")
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help="relative slowdown flagged as a regression")
+    parser.add_argument('-s', '--scales', type=int, nargs='+', default=DEFAULT_SCALES, choices=SCALES)
+    parser.add_argument('-r', '--repeat', type=int, default=REPEAT)
+    parser.add_argument('-k', '--benchmarks', nargs='+', default=None,
+                        choices=[benchmark.name for benchmark in BENCHMARKS])
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scales, args.repeat, args.benchmarks)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=1)
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compare(results, baseline, args.threshold)
+    for key, reference, median, ratio in regressions:
+        print(f"REGRESSION {key}: {reference * 1e3:.2f} ms -> {median * 1e3:.2f} ms ({ratio:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
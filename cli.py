@@ -0,0 +1,40 @@
+import importlib
+import sys
+
+# command -> (module, description), a module is only imported when its command runs
+COMMANDS = {
+    'batch': ('batch_analysis', "creep analysis of every curve/data file pair in a directory"),
+    'sweep': ('srs_sweep', "merge every grain and strain rate of a srs export and compute m"),
+    'spherical': ('spherical_analysis', "indentation stress-strain curves of a spherical indentation workbook"),
+    'benchmark': ('benchmark', "time the analysis hot paths"),
+    'gui': ('main', "open the analysis window"),
+}
+
+
+def usage():
+    lines = ["usage: python cli.py <command> [options]", "", "commands:"]
+    lines += [f"  {command:12s}{description}" for command, (_, description) in COMMANDS.items()]
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """run a command of the analysis, e.g. python cli.py batch example_file -o summary.csv"""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0
+    command, *args = argv
+    if command not in COMMANDS:
+        print(f"unknown command {command!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    module = importlib.import_module(COMMANDS[command][0])
+    if command == 'gui':
+        module.main()
+        return 0
+    sys.argv[0] = f"{sys.argv[0]} {command}"
+    return module.main(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
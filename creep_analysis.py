@@ -1,47 +1,115 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import math
+import sys
+import time
 import numpy as np
-from scipy.optimize import curve_fit
+
+import file_manager
+import creep_results
+import downsampling
+import profiling
 
 
 HARDNESS_TIME_FILE_PATH = "./example_file/As-built sample curve.TXT"
 STIFFNESS_FILE_PATH = './example_file/As-built sample data.TXT'
 
 START_STEP_SIZE = 100
-LIMIT_STEP_SIZE = 1000
-
-hardness_time_data = pd.read_csv(HARDNESS_TIME_FILE_PATH, sep='\t')
-stiffness_data = pd.read_csv(STIFFNESS_FILE_PATH, sep='\t', encoding='cp1252')
-
-
-def create_data_manager():
-    case_names = get_exp_case(hardness_time_data)
-    data_manager = {name: {"raw_data": None,
-                           "s_value": None,
-                           "yield_point": None,
-                           "er_value": None,
-                           "creep_data": {}} for name in case_names}
-
-    # raw data
-    raw_data_insert(data_manager, case_names)
-    s_value_insert(stiffness_data, data_manager, case_names)
-    er_value_insert(stiffness_data, data_manager, case_names)
-    creep_data_insert(data_manager, case_names)
+LIMIT_STEP_SIZE = 1000  # largest step an adaptive strain rate estimator may grow to
+
+# difference: forward difference over step points, savgol: Savitzky-Golay derivative over 2 * step + 1 points,
+# fitted: derivative of the fitted creep law
+STRAIN_RATE_ESTIMATORS = ('difference', 'savgol', 'fitted')
+ADAPTIVE_SNR = 10  # an adaptive step grows until the derivative is this many times its noise
+SRS_FIT_WINDOW = 3000  # number of creep tail points used for the SRS fit
+
+HOLD_GRADIENT_SPACING = 20  # points between the load values compared for hold detection
+
+EPSILON = 0.75  # indenter geometry factor of the contact depth
+TIP_RADIUS = 10  # area function radius
+
+STREAM_BATCH_CASES = 8  # cases analysed per create_data_manager call of stream_data_manager
+
+
+def load_experiment(hardness_time_file_path, stiffness_file_path):
+    """return the time-load-displacement curves and the O&P parameters of one experiment"""
+    with profiling.span('read_curves', file=hardness_time_file_path):
+        hardness_time_data = file_manager.txt_to_df(hardness_time_file_path)
+    with profiling.span('read_parameters', file=stiffness_file_path):
+        stiffness_data = file_manager.txt_to_df(stiffness_file_path, encoding='cp1252')
+    return hardness_time_data, stiffness_data
+
+
+def create_data_manager(hardness_time_data, stiffness_data, hold_spacing=HOLD_GRADIENT_SPACING,
+                        tip_radius=TIP_RADIUS, epsilon=EPSILON, step_size=START_STEP_SIZE,
+                        srs_fit_window=SRS_FIT_WINDOW, strain_rate_estimator='difference', adaptive_step=False):
+    with profiling.span('create_data_manager'):
+        case_names = get_exp_case(hardness_time_data)
+        data_manager = creep_results.CreepResults(case_names)
+
+        # raw data
+        with profiling.span('raw_data', cases=len(case_names)):
+            raw_data_insert(hardness_time_data, data_manager)
+        with profiling.span('parameter_table'):
+            parameter_table = file_manager.ParameterTable(stiffness_data)
+        with profiling.span('s_value'):
+            s_value_insert(parameter_table, data_manager)
+        with profiling.span('er_value'):
+            er_value_insert(parameter_table, data_manager)
+        with profiling.span('creep_data'):
+            creep_data_insert(data_manager, hold_spacing)
+
+        # fitting
+        import_fitting()
+        with profiling.span('fitting'):
+            compute_creep_fitting(data_manager)
+            profiling.record_fits(data_manager)
+
+        #  calculation based on the function
+        with profiling.span('area'):
+            area_insert(data_manager, tip_radius, epsilon)
+        with profiling.span('hardness'):
+            hardness_insert(data_manager)
+        with profiling.span('strain_rate'):
+            strain_rate_insert(data_manager, step_size, strain_rate_estimator, adaptive_step, tip_radius)
+        with profiling.span('log'):
+            compute_log(data_manager)
+        with profiling.span('srs'):
+            srs_insert(data_manager, srs_fit_window)
 
-    # fitting
-    compute_creep_fitting(data_manager, case_names)
-
-    #  calculation based on the function
-    area_insert(data_manager, case_names)
-    hardness_insert(data_manager, case_names)
-    strain_rate_insert(data_manager, case_names)
-    compute_log(data_manager, case_names)
+    return data_manager
 
-    # for key in data_manager.copy().keys():
-    #     if key not in case_names:
-    #         del data_manager[key]
 
+def stream_data_manager(hardness_time_file_path, stiffness_data, batch_cases=STREAM_BATCH_CASES,
+                        dtype=np.float32, keep_raw=False, chunksize=file_manager.CHUNK_SIZE, **create_kwargs):
+    """create_data_manager for an export too large to load at once: the curve columns are streamed in one
+    pass as dtype, without building the wide frame, and analysed in batches of whole groups of about
+    batch_cases cases. the raw time/load/displacement of a batch are released after it unless keep_raw.
+    create_kwargs (tip_radius, srs_fit_window, ...) are passed on to create_data_manager"""
+    schema = file_manager.read_schema(hardness_time_file_path)
+    data_manager = creep_results.CreepResults(schema.curve_names)
+
+    batches = [[]]
+    for case in data_manager.values():
+        # a group stays in one batch so its repetitions warm start each other's fits
+        if len(batches[-1]) >= batch_cases and case.group != batches[-1][-1].group:
+            batches.append([])
+        batches[-1].append(case)
+
+    with profiling.span('read_curves', file=hardness_time_file_path, cases=len(data_manager)):
+        columns = file_manager.read_curves(hardness_time_file_path, None, chunksize, dtype, schema).columns
+    for batch in batches:
+        names = {case.name for case in batch}
+        curves = file_manager.CurveColumns({key: values for key, values in columns.items() if key[0] in names})
+        batch_results = create_data_manager(curves, stiffness_data, **create_kwargs)
+        if not keep_raw:
+            for key in curves.columns:
+                del columns[key]
+        for case in batch_results.values():
+            if not keep_raw:
+                case.time = case.fn = case.pd = None
+                if case.creep_load is not None:
+                    case.creep_load = np.array(case.creep_load, dtype=float)  # a copy, the view kept the raw load
+            data_manager[case.name] = case
     return data_manager
 
 
@@ -50,168 +118,332 @@ def creep_curve_function(t, a, b, k):  # t = time and a, b, k = fitting constant
     return h
 
 
-def compute_creep_fitting(data_manager, case_names):
-    for case in case_names:
-        x = data_manager[case]['creep_data']['creep_time']
-        yn = data_manager[case]['creep_data']['creep_displacement']
+def creep_curve_jacobian(t, a, b, k):
+    """partial derivatives of creep_curve_function with respect to a, b and k"""
+    t = np.asarray(t, dtype=float)
+    t_pow_b = t ** b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d_b = np.where(t > 0, a * t_pow_b * np.log(np.where(t > 0, t, 1.0)), 0.0)
+    return np.column_stack([t_pow_b, d_b, t])
+
+
+def creep_initial_guess(t, h):
+    """a and b from a straight line fit of ln(h) against ln(t), k from what the power law leaves at the end"""
+    t = np.asarray(t, dtype=float)
+    h = np.asarray(h, dtype=float)
+    positive = (t > 0) & (h > 0)
+    if positive.sum() < 2:
+        return None
+
+    b, ln_a = np.polyfit(np.log(t[positive]), np.log(h[positive]), 1)
+    a = np.exp(ln_a)
+    k = (h[positive][-1] - a * t[positive][-1] ** b) / t[positive][-1]
+    return [a, b, k]
+
+
+def import_fitting():
+    """import scipy.optimize in an 'import' span of its own before the first fit, so the 'fitting' span
+    times the fits and not the seconds of a cold scipy import"""
+    if 'scipy.optimize' in sys.modules:
+        return
+    with profiling.span('import', module='scipy.optimize'):
+        import scipy.optimize  # noqa: F401
+
+
+def fit_creep_curve(t, h, warm_start=None):
+    """fit creep_curve_function to one creep segment and return fitting constants and fit info.
+    starts from warm_start (e.g. a neighbouring repetition), then the log-linear guess, then scipy's default
+    and raises RuntimeError when none converges"""
+    from scipy.optimize import curve_fit
+
+    t = np.asarray(t, dtype=float)
+    h = np.asarray(h, dtype=float)
+
+    starts = [('warm', warm_start), ('log-linear', creep_initial_guess(t, h)), ('default', [1.0, 1.0, 1.0])]
+    info = {'nfev': 0, 'njev': 0, 'attempts': 0, 'start': None, 'fit_time': 0.0}
+    start_time = time.perf_counter()
+    for name, p0 in starts:
+        if p0 is None or not np.all(np.isfinite(p0)):
+            continue
+        info['attempts'] += 1
         try:
-            popt, pcov = curve_fit(creep_curve_function, x, yn)
-
+            popt, pcov, infodict, mesg, ier = curve_fit(creep_curve_function, t, h, p0=p0,
+                                                        jac=creep_curve_jacobian, full_output=True)
         except RuntimeError:
-            case_names.remove(case)
+            continue
+        finally:
+            info['fit_time'] = time.perf_counter() - start_time
+        info['nfev'] += int(infodict.get('nfev', 0))
+        info['njev'] += int(infodict.get('njev', 0))
+        info['start'] = name
+        return popt, info
+
+    raise RuntimeError(f"creep fitting did not converge after {info['attempts']} starting points")
+
+
+def compute_creep_fitting(data_manager):
+    last_constants = {}  # case without repetition -> constants of the last converged repetition
+    for case in data_manager.ok_cases():
+        x = case.creep_time
+        yn = case.creep_displacement
+        try:
+            popt, fit_info = fit_creep_curve(x, yn, last_constants.get(case.group))
+
+        except RuntimeError as error:
+            case.fail('fitting', error)
 
         else:
             a = popt[0]
             b = popt[1]
             k = popt[2]
+            last_constants[case.group] = popt
 
-            fitted_h = [creep_curve_function(t, a, b, k) for t in x]
-            data_manager[case]['creep_data']['fitted_creep_displacement'] = fitted_h
+            case.fitting_constants = np.array([a, b, k], dtype=float)
+            case.fit_info = fit_info
+            case.set_array('fitted_creep_displacement', creep_curve_function(x, a, b, k))
 
 
-def compute_log(data_manager, case_names):
-    for case in case_names:
-        strain_rate_array = data_manager[case]['creep_data']['strain_rate']
-        try:
-            hardness_array = data_manager[case]['creep_data']['hardness']
+def compute_log(data_manager):
+    cases = data_manager.ok_cases()
 
-        except KeyError:
-            case_names.remove(case)
+    strain_rate, lengths = stack_segments([case.strain_rate for case in cases])
+    hardness, _ = stack_segments([case.hardness[:length] for case, length in zip(cases, lengths)])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        log_strain_rate = np.log(strain_rate)
+        log_hardness = np.log(hardness)
 
-        else:
-            log_strain_rate_array = []
-            log_hardness_array = []
-            for i in range(len(strain_rate_array)):
-                log_strain_rate = math.log(strain_rate_array[i])
-                log_hardness = math.log(hardness_array[i])
+    for i, case in enumerate(cases):
+        case.log_strain_rate = log_strain_rate[i, :lengths[i]]
+        case.log_hardness = log_hardness[i, :lengths[i]]
 
-                log_strain_rate_array.append(log_strain_rate)
-                log_hardness_array.append(log_hardness)
 
-            data_manager[case]['creep_data']['log_strain_rate'] = log_strain_rate_array
-            data_manager[case]['creep_data']['log_hardness'] = log_hardness_array
+def creep_data_insert(data_manager, spacing=HOLD_GRADIENT_SPACING):
+    for case in data_manager.ok_cases():
+        segments = find_hold_segments(case.fn, spacing)
+        if not segments:
+            case.fail('creep_data', "no load hold followed by unloading found")
+            continue
+        creep_start_idx, creep_end_idx = segments[0]
 
+        t_0 = case.time[creep_start_idx]
+        h_0 = case.pd[creep_start_idx]
 
-def creep_data_insert(data_manager, case_names):
-    for case in case_names:
-        case_df = data_manager[case]['raw_data']
+        h = case.pd[creep_start_idx:creep_end_idx]
+        t = case.time[creep_start_idx:creep_end_idx]
+        f = case.fn[creep_start_idx:creep_end_idx]
 
-        creep_idx = find_creep_start_end_idx(case_df)
-        creep_start_idx = creep_idx[0]
-        creep_end_idx = creep_idx[1]
+        case.creep_start_idx = creep_start_idx
+        case.creep_end_idx = creep_end_idx
+        case.creep_displacement_start = float(h_0)
+        case.creep_time_start = float(t_0)
 
-        t_0 = data_manager[case]['raw_data']['Time'][creep_start_idx]
-        h_0 = data_manager[case]['raw_data']['Pd'][creep_start_idx]
-        f_0 = data_manager[case]['raw_data']['Fn'][creep_start_idx]
+        case.set_array('creep_displacement', h - h_0)  # normalizing
+        case.set_array('creep_time', t - t_0)  # normalizing
+        case.creep_load = f  # view of the raw load
 
-        h = data_manager[case]['raw_data']['Pd'][creep_start_idx:creep_end_idx]
-        t = data_manager[case]['raw_data']['Time'][creep_start_idx:creep_end_idx]
-        f = data_manager[case]['raw_data']['Fn'][creep_start_idx:creep_end_idx]
 
-        h_series = h - h_0  # normalizing
-        t_series = t - t_0  # normalizing
-        f_series = f
+def strain_rate_insert(data_manager, step_size=START_STEP_SIZE, estimator='difference', adaptive=False,
+                       tip_radius=TIP_RADIUS):
+    """strain rate of every creep segment at once with one of STRAIN_RATE_ESTIMATORS, one value per point with
+    step_size points after it, for the interval from that point on. adaptive lets the step of difference and
+    savgol grow up to LIMIT_STEP_SIZE where the measured creep displacement changes too little over step_size
+    to stand out of its noise"""
+    if estimator not in STRAIN_RATE_ESTIMATORS:
+        raise ValueError(f"unknown strain rate estimator {estimator!r}, "
+                         f"expected one of {', '.join(STRAIN_RATE_ESTIMATORS)}")
+    cases = data_manager.ok_cases()
 
-        displacement_list = h_series.tolist()
-        time_list = t_series.tolist()
-        load_list = f_series.tolist()
+    sqrt_area, lengths = stack_segments([case.sqrt_area for case in cases])
+    time, _ = stack_segments([case.creep_time for case in cases])
+    # the area follows the smooth fitted displacement, the step is chosen on the noisy measured one
+    displacement = stack_segments([case.creep_displacement for case in cases])[0] if adaptive else None
 
-        data_manager[case]['creep_data']['creep_displacement_start'] = h_0.tolist()
-        data_manager[case]['creep_data']['creep_time_start'] = t_0.tolist()
+    if estimator == 'difference':
+        strain_rate = strain_rate_difference(sqrt_area, time, step_size, adaptive, reference=displacement)
+    elif estimator == 'savgol':
+        strain_rate = strain_rate_savgol(sqrt_area, time, step_size, adaptive, reference=displacement)
+    else:
+        constants = np.array([case.fitting_constants for case in cases], dtype=float).reshape(-1, 3)
+        strain_rate = strain_rate_fitted(sqrt_area, time, constants, step_size, tip_radius)
+    lengths = np.maximum(lengths - step_size, 0)  # the last step_size points start no full interval
 
-        data_manager[case]['creep_data']['creep_displacement'] = displacement_list
-        data_manager[case]['creep_data']['creep_time'] = time_list
-        data_manager[case]['creep_data']['creep_load'] = load_list
+    for i, case in enumerate(cases):
+        case.strain_rate = strain_rate[i, :lengths[i]]
 
 
-def strain_rate_insert(data_manager, case_names):
-    for case in case_names:
-        try:
-            case_sqrt_area = data_manager[case]['creep_data']['sqrt_area_[m]']  # get list
+def strain_rate_calc(sqrt_area_1, sqrt_area_2, time_1, time_2):
+    sqrt_area_grad = (sqrt_area_2 - sqrt_area_1)
+    time_grad = (time_2 - time_1)
+    strain_rate = (1 / sqrt_area_1) * (sqrt_area_grad / time_grad)
 
-        except KeyError:
-            case_names.remove(case)
+    return strain_rate
 
-        else:
-            time_array = data_manager[case]['creep_data']['creep_time']
-            length_df = len(time_array)
-            strain_rate_array = []
 
-            step_size = START_STEP_SIZE
+def strain_rate_calc_array(sqrt_area, time, step_size):
+    """strain_rate_calc between every point and the point step_size later along the last axis"""
+    sqrt_area = np.asarray(sqrt_area, dtype=float)
+    time = np.asarray(time, dtype=float)
+    if sqrt_area.shape[-1] <= step_size:
+        return np.empty(sqrt_area.shape[:-1] + (0,))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return strain_rate_calc(sqrt_area[..., :-step_size], sqrt_area[..., step_size:],
+                                time[..., :-step_size], time[..., step_size:])
+
+
+def strain_rate_difference(sqrt_area, time, step_size=START_STEP_SIZE, adaptive=False, limit=LIMIT_STEP_SIZE,
+                           reference=None):
+    """forward difference strain rate of (cases, samples) segments, one value per point that has step_size
+    points after it. adaptive takes for every point the smallest of step_size, 2 * step_size, ... limit
+    over which the reference (sqrt_area by default) changes ADAPTIVE_SNR times its noise, or the largest step
+    that fits"""
+    if not adaptive:
+        return strain_rate_calc_array(sqrt_area, time, step_size)
+    sqrt_area = np.asarray(sqrt_area, dtype=float)
+    time = np.asarray(time, dtype=float)
+    reference = sqrt_area if reference is None else np.asarray(reference, dtype=float)
+    width = max(sqrt_area.shape[-1] - step_size, 0)
+    threshold = ADAPTIVE_SNR * np.sqrt(2) * _noise_level(reference)
+
+    strain_rate = np.full(sqrt_area.shape[:-1] + (width,), np.nan)
+    found = np.zeros(strain_rate.shape, dtype=bool)
+    for step in _adaptive_steps(step_size, limit):
+        if step >= sqrt_area.shape[-1]:
+            break
+        n = sqrt_area.shape[-1] - step
+        difference = reference[..., step:] - reference[..., :-step]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            candidate = strain_rate_calc(sqrt_area[..., :n], sqrt_area[..., step:], time[..., :n], time[..., step:])
+        # larger steps replace smaller ones until a step is accepted, so points ending up without
+        # an accepted step keep the largest one that fits
+        replace = ~found[..., :n] & np.isfinite(candidate)
+        strain_rate[..., :n][replace] = candidate[replace]
+        with np.errstate(invalid='ignore'):
+            found[..., :n] |= replace & (np.abs(difference) >= threshold)
+    return strain_rate
 
-            for i in range(length_df - step_size):  # creep_end_idx-1 b.c. need to calc gradient.
-                strain_rate = strain_rate_calc(case_sqrt_area[i], case_sqrt_area[i + step_size]
-                                               , time_array[i], time_array[i + step_size])
-                strain_rate_array.append(strain_rate)
 
-            data_manager[case]['creep_data']['strain_rate'] = strain_rate_array
+def strain_rate_savgol(sqrt_area, time, step_size=START_STEP_SIZE, adaptive=False, limit=LIMIT_STEP_SIZE,
+                       reference=None):
+    """Savitzky-Golay (polynomial order 1) derivative strain rate of (cases, samples) segments: the least
+    squares slope over the step_size + 1 points from every point on, aligned like strain_rate_difference
+    which takes the secant over the same points. the windowed sums come from cumulative sums, so the cost
+    doesn't grow with the window. adaptive grows the step like strain_rate_difference, a step is accepted
+    when the slope of the reference (sqrt_area by default) stands ADAPTIVE_SNR times out of its noise"""
+    sqrt_area = np.asarray(sqrt_area, dtype=float)
+    time = np.asarray(time, dtype=float)
+    reference = sqrt_area if reference is None else np.asarray(reference, dtype=float)
+    noise = _noise_level(reference)
+    d_sqrt_area = _window_slopes(sqrt_area)
+    d_time = _window_slopes(time)
+    d_reference = d_sqrt_area if reference is sqrt_area else _window_slopes(reference)
+
+    length = sqrt_area.shape[-1]
+    strain_rate = np.full(sqrt_area.shape[:-1] + (max(length - step_size, 0),), np.nan)
+    found = np.zeros(strain_rate.shape, dtype=bool)
+    for step in (_adaptive_steps(step_size, limit) if adaptive else [step_size]):
+        if step >= length:
+            break
+        n = length - step
+        with np.errstate(invalid='ignore', divide='ignore'):
+            candidate = d_sqrt_area(step + 1) / d_time(step + 1) / sqrt_area[..., :n]
+        # the slope of w points has the noise of one point over sqrt(sum of (j - mean j)^2)
+        threshold = ADAPTIVE_SNR * noise / np.sqrt((step + 1) * ((step + 1) ** 2 - 1) / 12)
+        replace = ~found[..., :n] & np.isfinite(candidate)
+        strain_rate[..., :n][replace] = candidate[replace]
+        with np.errstate(invalid='ignore'):
+            found[..., :n] |= replace & (np.abs(d_reference(step + 1)) >= threshold)
+    return strain_rate
 
 
-def strain_rate_calc(sqrt_area_1, sqrt_area_2, time_1, time_2):
-    sqrt_area_grad = (sqrt_area_2 - sqrt_area_1)
-    time_grad = (time_2 - time_1)
-    strain_rate = (1 / sqrt_area_1) * (sqrt_area_grad / time_grad)
+def _window_slopes(values):
+    """return slopes(width): least squares slope against the index of every width consecutive points along
+    the last axis, one per window start"""
+    length = values.shape[-1]
+    with np.errstate(invalid='ignore'):
+        centered = values - np.nanmean(values, axis=-1, keepdims=True)  # small sums keep the differences exact
+    index = np.arange(length) - length / 2
+    zeros = np.zeros(values.shape[:-1] + (1,))
+    sums = np.concatenate((zeros, np.cumsum(centered, axis=-1)), axis=-1)
+    moments = np.concatenate((zeros, np.cumsum(index * centered, axis=-1)), axis=-1)
 
-    return strain_rate
+    def slopes(width):
+        starts = np.arange(length - width + 1)
+        window_sum = sums[..., starts + width] - sums[..., starts]
+        window_moment = moments[..., starts + width] - moments[..., starts]
+        centre = index[starts] + (width - 1) / 2
+        return (window_moment - centre * window_sum) / (width * (width ** 2 - 1) / 12)
+    return slopes
 
 
-def hardness_insert(data_manager, case_names):
-    for case in case_names:
-        try:
-            case_area = data_manager[case]['creep_data']['area_[mm^2]']
+def strain_rate_fitted(sqrt_area, creep_time, constants, step_size=START_STEP_SIZE, tip_radius=TIP_RADIUS):
+    """strain rate from the derivative of the fitted creep law h = a t^b + k t of (cases, samples) segments,
+    constants holds a, b, k of every case. taken in the middle of the step_size interval from every point on
+    and divided by the sqrt area at its start, aligned like strain_rate_difference. the load is taken as
+    constant over the hold, so only the displacement changes the contact area"""
+    sqrt_area = np.asarray(sqrt_area, dtype=float)
+    creep_time = np.asarray(creep_time, dtype=float)
+    n = max(sqrt_area.shape[-1] - step_size, 0)
+    middle_time = (creep_time[..., :n] + creep_time[..., step_size:step_size + n]) / 2
+    middle_sqrt_area = (sqrt_area[..., :n] + sqrt_area[..., step_size:step_size + n]) / 2
+    a, b, k = (np.asarray(constants, dtype=float).T[..., None])
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        displacement_rate = np.where(middle_time > 0, a * b * middle_time ** (b - 1) + k, np.nan)
+        # sqrt(A * 1e-9) with dA/dh = 2 pi R
+        d_sqrt_area = 2 * np.pi * tip_radius * 1e-9 * displacement_rate / (2 * middle_sqrt_area)
+        return d_sqrt_area / sqrt_area[..., :n]
 
-        except KeyError:
-            case_names.remove(case)
 
-        else:
-            fn_array = data_manager[case]['creep_data']['creep_load']
-            length_df = len(fn_array)
-            hardness_array = []
-            j = 0
-            for i in range(length_df):
-                hardness = hardness_calc(fn_array[i], case_area[i])
-                hardness_array.append(hardness)
+def _adaptive_steps(step_size, limit):
+    steps = [step_size]
+    while steps[-1] * 2 < limit:
+        steps.append(steps[-1] * 2)
+    if limit > steps[-1]:
+        steps.append(limit)
+    return steps
 
-            data_manager[case]['creep_data']['hardness'] = hardness_array
 
+def _noise_level(values):
+    """robust noise standard deviation of every row from the median of its second differences"""
+    second_difference = np.diff(values, n=2, axis=-1)
+    with np.errstate(invalid='ignore'):
+        if second_difference.shape[-1] == 0:
+            return np.zeros(values.shape[:-1] + (1,))
+        return np.nanmedian(np.abs(second_difference), axis=-1, keepdims=True) / 0.6745 / np.sqrt(6)
 
-def area_insert(data_manager, case_names):
-    for case in case_names:
-        try:
-            pd_series = data_manager[case]['creep_data']['fitted_creep_displacement']
 
-        except KeyError:
-            case_names.remove(case)
+def hardness_insert(data_manager):
+    cases = data_manager.ok_cases()
+
+    fn, lengths = stack_segments([case.creep_load for case in cases])
+    area, _ = stack_segments([case.area for case in cases])
+    hardness = hardness_calc_array(fn, area)
+
+    for i, case in enumerate(cases):
+        case.hardness = hardness[i, :lengths[i]]
 
-        else:
-            fn_series = data_manager[case]['creep_data']['creep_load']
-            time_series = data_manager[case]['creep_data']['creep_time']
-            case_stiffness = data_manager[case]['s_value']
 
-            pd_0 = data_manager[case]['creep_data']['creep_displacement_start']
+def area_insert(data_manager, tip_radius=TIP_RADIUS, epsilon=EPSILON):
+    cases = data_manager.ok_cases()
 
-            length_df = len(pd_series)
+    pd_series, lengths = stack_segments([case.fitted_creep_displacement for case in cases])
+    fn_series, _ = stack_segments([case.creep_load for case in cases])
+    pd_0 = np.array([case.creep_displacement_start for case in cases], dtype=float)
+    case_stiffness = np.array([case.s_value for case in cases], dtype=float)
 
-            area_array = []
-            sqrt_area_array = []
-            time_array = []
-            for i in range(length_df):
-                area = area_calc(pd_series[i] + pd_0, fn_series[i], case_stiffness)
-                time = time_series[i]
-                sqrt_area = sqrt_area_calc(area)
+    area = area_calc_array(pd_series + pd_0[:, None], fn_series, case_stiffness[:, None], tip_radius, epsilon)
+    sqrt_area = sqrt_area_calc_array(area)
 
-                time_array.append(time)
-                area_array.append(area)
-                sqrt_area_array.append(sqrt_area)
+    for i, case in enumerate(cases):
+        case.area = area[i, :lengths[i]]
+        case.sqrt_area = sqrt_area[i, :lengths[i]]
 
-            data_manager[case]['creep_data']['area_[mm^2]'] = area_array
-            data_manager[case]['creep_data']['sqrt_area_[m]'] = sqrt_area_array
-            data_manager[case]['creep_data']['time'] = time_array
 
+# scalar reference implementations, the *_array versions below apply the same formulas to whole segments
 
 def area_calc(pd, fn, stiffness):
-    epsilon = 0.75
-    radius = 10
+    epsilon = EPSILON
+    radius = TIP_RADIUS
     area = 2 * math.pi * radius * (pd - (epsilon * fn) / stiffness)
     return area
 
@@ -226,93 +458,127 @@ def sqrt_area_calc(area):
     return sqrt_area
 
 
-def find_creep_start_end_idx(time_fn_pd_data):
-    """return array where the first element indicating creep start index and the second creep end index"""
-    length_data = len(time_fn_pd_data)
-    spacing = 20  # gradient spacing
+def area_calc_array(pd, fn, stiffness, tip_radius=TIP_RADIUS, epsilon=EPSILON):
+    return 2 * np.pi * tip_radius * (pd - (epsilon * fn) / stiffness)
+
+
+def hardness_calc_array(pd, area):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (pd / area) * 1e3
+
+
+def sqrt_area_calc_array(area):
+    with np.errstate(invalid='ignore'):
+        return np.sqrt(area * 1e-9)
 
-    time = time_fn_pd_data['Time']
-    fn = time_fn_pd_data['Fn']
-    pd = time_fn_pd_data['Pd']
 
-    for i in range(length_data - spacing):  # 0, 1, 3, ..., (max - spacing - 1)
-        y1 = fn[i]
-        y2 = fn[i+spacing]
-        gradient_y = round((y2 - y1) * 100)
+def stack_segments(segments):
+    """return segments of different lengths as one NaN padded (cases, samples) array and their lengths"""
+    lengths = np.array([len(segment) for segment in segments], dtype=int)
+    stacked = np.full((len(segments), lengths.max(initial=0)), np.nan)
+    for i, segment in enumerate(segments):
+        stacked[i, :lengths[i]] = segment
+    return stacked, lengths
 
-        if gradient_y == 0:
-            creep_start_idx = i
 
-            for j in range(creep_start_idx, length_data - spacing):
-                y1 = fn[j]
-                y2 = fn[j+spacing]
-                gradient_y = round((y2 - y1) * 10)
+class NoHoldSegmentError(ValueError):
+    """raised when a load signal has no load hold followed by unloading"""
 
-                if gradient_y < 0:
-                    creep_end_idx = j
-                    break
+
+def find_creep_start_end_idx(time_fn_pd_data, spacing=HOLD_GRADIENT_SPACING):
+    """return array where the first element indicating creep start index and the second creep end index"""
+    segments = find_hold_segments(time_fn_pd_data['Fn'], spacing)
+    if not segments:
+        raise NoHoldSegmentError("no load hold followed by unloading found")
+    return list(segments[0])
+
+
+def find_hold_segments(fn, spacing=HOLD_GRADIENT_SPACING):
+    """return (start, end) index of every load hold that ends with unloading, in order.
+    a hold starts where the load changes by less than 0.005 mN over spacing points and
+    ends at the first point after it where the load drops by at least 0.05 mN over spacing points"""
+    fn = np.asarray(fn, dtype=float)
+    if len(fn) <= spacing:
+        return []
+
+    load_difference = fn[spacing:] - fn[:-spacing]
+    plateau_idx = np.flatnonzero(np.round(load_difference * 100) == 0)
+    unloading = np.round(load_difference * 10) < 0
+    unloading_idx = np.flatnonzero(unloading)
+    not_unloading_idx = np.flatnonzero(~unloading)
+
+    segments = []
+    position = 0
+    while True:
+        k = np.searchsorted(plateau_idx, position)
+        if k == len(plateau_idx):
             break
+        creep_start_idx = plateau_idx[k]
 
-    return [creep_start_idx, creep_end_idx]
+        k = np.searchsorted(unloading_idx, creep_start_idx)
+        if k == len(unloading_idx):
+            break  # hold without unloading, e.g. the zero load after the last unloading
+        creep_end_idx = unloading_idx[k]
+        segments.append((int(creep_start_idx), int(creep_end_idx)))
 
+        # the next hold can only start once this unloading is over
+        k = np.searchsorted(not_unloading_idx, creep_end_idx)
+        if k == len(not_unloading_idx):
+            break
+        position = not_unloading_idx[k]
 
-def s_value_insert(stiffness_df, data_dict, case_array):
-    for case in case_array:
-        rep = case.split("_")[-1]
-        case_name = '_'.join(case.split("_")[0:-1])
-        stiffness = get_stiffness(stiffness_df, case_name, int(rep))
-        data_dict[case]['s_value'] = float(stiffness)
+    return segments
 
 
-def er_value_insert(stiffness_df, data_dict, case_array):
-    for case in case_array:
-        rep = case.split("_")[-1]
-        case_name = '_'.join(case.split("_")[0:-1])
-        er = get_er(stiffness_df, case_name, int(rep))
-        data_dict[case]['er_value'] = float(er)
+def s_value_insert(parameter_table, data_manager):
+    for case in data_manager.ok_cases():
+        try:
+            case.s_value = float(get_stiffness(parameter_table, case.group, case.repetition))
+        except KeyError:
+            case.fail('s_value', f"no S (O&P) for {case.group} measurement {case.repetition}")
 
 
-def raw_data_insert(data_dict, case_array):
-    for case in case_array:
-        temp_df = get_displacement_time_dataframe(hardness_time_data, case)
-        data_dict[case]['raw_data'] = temp_df
+def er_value_insert(parameter_table, data_manager):
+    for case in data_manager.ok_cases():
+        try:
+            case.er_value = float(get_er(parameter_table, case.group, case.repetition))
+        except KeyError:
+            case.fail('er_value', f"no Er (O&P) for {case.group} measurement {case.repetition}")
+
+
+def raw_data_insert(hardness_time_data, data_manager):
+    schema = _curve_source(hardness_time_data)
+    for case in data_manager.ok_cases():
+        try:
+            # rows of the schema array, no copy per case
+            case.time = schema.curve_values(case.name, 'Time', 'X')
+            case.fn = schema.curve_values(case.name, 'Fn', 'Y')
+            case.pd = schema.curve_values(case.name, 'Pd', 'Y')
+        except KeyError as error:
+            case.fail('raw_data', f"missing column {error}")
 
 
 def get_exp_case(data_frame: pd.DataFrame):
     """receive pandas dataframe that contains nano-indentation creep experiment data,
     and return experiment cases as an array(list) of string"""
-    columns = data_frame.columns
+    return list(_curve_source(data_frame).curve_names)
 
-    temp_array = []
-    for column in columns:
-        split_name = column.split("_")[1:-2]  # choose only the name of the experiment cases
-        combined_name = '_'.join(split_name)  # put them back together
-        temp_array.append(combined_name)
 
-    unique_array = []  # only get unique case name from experiment
-    for case in temp_array:
-        if (case not in unique_array) & (len(case) != 0):
-            unique_array.append(case)
+def _curve_source(hardness_time_data):
+    """curves streamed by file_manager.read_curves are used as they are, a dataframe is indexed"""
+    if isinstance(hardness_time_data, file_manager.CurveColumns):
+        return hardness_time_data
+    return file_manager.ExportSchema(hardness_time_data)
 
-    return unique_array
 
+def get_er(parameter_table: file_manager.ParameterTable, case: str, rep: int):
+    """return elastic modulus based on parameter table, case, and repetition"""
+    return parameter_table.get(case, rep, "Er (O&P)")
 
-def get_er(data_frame: pd.DataFrame, case: str, rep: int):
-    """return elastic modulus based on data frame, case, and repetition"""
-    er_value = data_frame['Value'][(stiffness_data['Group'] == case) &
-                              (stiffness_data['Parameter'] == "Er (O&P)") &
-                              (stiffness_data['Measurement'] == rep)].values[0]
-    return er_value
 
-
-def get_stiffness(data_frame: pd.DataFrame, case: str, rep: int):
-    """return stiffness based on data frame, case, and repetition"""
-
-    s_value = data_frame['Value'][(stiffness_data['Group'] == case) &
-                              (stiffness_data['Parameter'] == "S (O&P)") &
-                              (stiffness_data['Measurement'] == rep)].values[0]
-
-    return s_value
+def get_stiffness(parameter_table: file_manager.ParameterTable, case: str, rep: int):
+    """return stiffness based on parameter table, case, and repetition"""
+    return parameter_table.get(case, rep, "S (O&P)")
 
 
 def get_displacement_time_dataframe(data_frame, case_with_rep):
@@ -328,53 +594,67 @@ def get_displacement_time_dataframe(data_frame, case_with_rep):
     return temp_df
 
 
-def main():
-    data_manager = create_data_manager()
+def fit_srs(log_strain_rate, log_hardness, window=SRS_FIT_WINDOW):
+    """return slope m (strain rate sensitivity) and intercept of ln(H) against ln(strain rate)
+    over the last window points of the creep hold"""
+    x_stable = log_strain_rate[-window: -1]
+    y_stable = log_hardness[-window: -1]
+    m, b = np.polyfit(x_stable, y_stable, 1)
+    return m, b
+
+
+def srs_insert(data_manager, window=SRS_FIT_WINDOW):
+    for case in data_manager.ok_cases():
+        try:
+            m, b = fit_srs(case.log_strain_rate, case.log_hardness, window)
+        except (ValueError, TypeError, np.linalg.LinAlgError) as error:
+            case.fail('srs', error)
+        else:
+            case.srs_m = float(m)
+            case.srs_intercept = float(b)
+
+
+def main(hardness_time_file_path=HARDNESS_TIME_FILE_PATH, stiffness_file_path=STIFFNESS_FILE_PATH):
+    import matplotlib.pyplot as plt
+
+    hardness_time_data, stiffness_data = load_experiment(hardness_time_file_path, stiffness_file_path)
+    data_manager = create_data_manager(hardness_time_data, stiffness_data)
     plt.figure(1)
-    for key, value in data_manager.items():
-        x = data_manager[key]['raw_data']['Pd']
-        y = data_manager[key]['raw_data']['Fn']
+    for key, case in data_manager.items():
+        if case.pd is None:
+            continue
+        x, y = downsampling.downsample(case.pd, case.fn)
         plt.plot(x, y, '.')
     plt.xlabel('Depth (nm)')
     plt.ylabel('Load (mN)')
 
     plt.figure(2)
-    for key, value in data_manager.items():
-        x = data_manager[key]['creep_data']['creep_time']
-        y = data_manager[key]['creep_data']['creep_displacement']
-        try:
-            fitted_y = data_manager[key]['creep_data']['fitted_creep_displacement']
-
-        except KeyError:
-            pass
-
-        else:
-            plt.plot(x, y, '.')
-            plt.plot(x, fitted_y, 'k')
+    for key, case in data_manager.items():
+        if case.fitted_creep_displacement is None:
+            continue
+        x, y = downsampling.downsample(case.creep_time, case.creep_displacement)
+        plt.plot(x, y, '.')
+        plt.plot(*downsampling.downsample(case.creep_time, case.fitted_creep_displacement), 'k')
     plt.xlabel('creep_time (s)')
     plt.ylabel('creep_displacement (nm)')
 
     fig = plt.figure(3)
-    for key, value in data_manager.items():
-        try:
-            x = data_manager[key]['creep_data']['log_strain_rate']
-            y = data_manager[key]['creep_data']['log_hardness']
-
-        except KeyError:
-            pass
-
-        else:
-            x_stable = x[-3000: -1]
-            y_stable = y[-3000: -1]
-
-            m, b = np.polyfit(x_stable, y_stable, 1)
-            n = 1/m
-            y2 = np.multiply(m, x_stable) + b
-            print(f'SRS, m for {key}: {round(m,3)}')
-            print(f'n for {key}: {round(n,3)}\n')
-
-            plt.plot(x, y, 'o', label = f'{key} m: {round(m,3)}, n :{round(n,3)}')
-            plt.plot(x_stable, y2, 'k')
+    for key, case in data_manager.items():
+        if not case.ok:
+            print(f'{key} {case.status}: {case.error}\n')
+            continue
+        x = case.log_strain_rate
+        y = case.log_hardness
+        x_stable = x[-SRS_FIT_WINDOW: -1]
+
+        m, b = case.srs_m, case.srs_intercept
+        n = 1/m
+        y2 = np.multiply(m, x_stable) + b
+        print(f'SRS, m for {key}: {round(m,3)}')
+        print(f'n for {key}: {round(n,3)}\n')
+
+        plt.plot(*downsampling.downsample(x, y), 'o', label = f'{key} m: {round(m,3)}, n :{round(n,3)}')
+        plt.plot(x_stable, y2, 'k')
 
     plt.legend()
     plt.xlabel('ln(Strain rate) (s^-1)')
@@ -385,5 +665,6 @@ def main():
     plt.show()
 
 
-main()
+if __name__ == '__main__':
+    main()
 
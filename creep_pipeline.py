@@ -0,0 +1,133 @@
+from collections import OrderedDict
+
+import creep_analysis
+import creep_results
+import file_manager
+import profiling
+
+# name: (upstream stages, parameters, fields written to each case)
+# every stage that can fail a case is an ancestor of the stages after it,
+# so the cases a stage works on are fully determined by its key
+STAGES = {
+    'raw_data': ((), (), ('time', 'fn', 'pd')),
+    's_value': (('raw_data',), (), ('s_value',)),
+    'er_value': (('s_value',), (), ('er_value',)),
+    'creep_data': (('er_value',), ('hold_spacing',),
+                   ('creep_start_idx', 'creep_end_idx', 'creep_displacement_start', 'creep_time_start',
+                    'creep_displacement', 'creep_time', 'creep_load')),
+    'fitting': (('creep_data',), (), ('fitting_constants', 'fit_info', 'fitted_creep_displacement')),
+    'area': (('fitting',), ('tip_radius', 'epsilon'), ('area', 'sqrt_area')),
+    'hardness': (('area',), (), ('hardness',)),
+    'strain_rate': (('area',), ('step_size', 'strain_rate_estimator', 'adaptive_step', 'tip_radius'),
+                    ('strain_rate',)),
+    'log': (('hardness', 'strain_rate'), (), ('log_strain_rate', 'log_hardness')),
+    'srs': (('log',), ('srs_fit_window',), ('srs_m', 'srs_intercept')),
+}
+
+CACHE_SIZE = 64  # stage results kept per pipeline (a full run is 10), least recently used go first
+
+DEFAULT_PARAMETERS = {
+    'hold_spacing': creep_analysis.HOLD_GRADIENT_SPACING,
+    'tip_radius': creep_analysis.TIP_RADIUS,
+    'epsilon': creep_analysis.EPSILON,
+    'step_size': creep_analysis.START_STEP_SIZE,
+    'strain_rate_estimator': 'difference',
+    'adaptive_step': False,
+    'srs_fit_window': creep_analysis.SRS_FIT_WINDOW,
+}
+
+
+class CreepPipeline:
+    """create_data_manager for one experiment with every stage memoized on its parameters and upstream stages.
+    run() with changed parameters recomputes only the stages depending on them, e.g. a new step_size reruns
+    strain_rate, log and srs and reuses raw data, S/Er, creep segments, fits, area and hardness"""
+
+    def __init__(self, hardness_time_data, stiffness_data, cache_size=CACHE_SIZE):
+        self.hardness_time_data = hardness_time_data
+        self.stiffness_data = stiffness_data
+        self.case_names = creep_analysis.get_exp_case(hardness_time_data)
+        self._parameter_table = None
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # stage key -> {case name: (failed_stage, error, written fields)}
+        self.computed_stages = []  # stages computed (not reused) by the last run()
+
+    def run(self, **parameters):
+        """return CreepResults for the given parameters (see DEFAULT_PARAMETERS)"""
+        unknown = set(parameters) - set(DEFAULT_PARAMETERS)
+        if unknown:
+            raise TypeError(f"unknown pipeline parameters: {', '.join(sorted(unknown))}")
+        parameters = {**DEFAULT_PARAMETERS, **parameters}
+
+        data_manager = creep_results.CreepResults(self.case_names)
+        keys = {}
+        self.computed_stages = []
+        for stage, (upstream, stage_parameters, fields) in STAGES.items():
+            key = (stage, tuple(parameters[name] for name in stage_parameters), tuple(keys[name] for name in upstream))
+            keys[stage] = key
+            if key not in self._cache:
+                if stage == 'fitting':
+                    creep_analysis.import_fitting()
+                with profiling.span(stage):
+                    self._compute(stage, data_manager, parameters)
+                self._cache[key] = _snapshot(data_manager, stage, fields)
+                self.computed_stages.append(stage)
+            else:
+                self._cache.move_to_end(key)
+                _restore(data_manager, self._cache[key])
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return data_manager
+
+    def clear(self):
+        """drop every cached stage result, the next run() computes all stages"""
+        self._cache.clear()
+
+    @property
+    def parameter_table(self):
+        if self._parameter_table is None:
+            self._parameter_table = file_manager.ParameterTable(self.stiffness_data)
+        return self._parameter_table
+
+    def _compute(self, stage, data_manager, parameters):
+        if stage == 'raw_data':
+            creep_analysis.raw_data_insert(self.hardness_time_data, data_manager)
+        elif stage == 's_value':
+            creep_analysis.s_value_insert(self.parameter_table, data_manager)
+        elif stage == 'er_value':
+            creep_analysis.er_value_insert(self.parameter_table, data_manager)
+        elif stage == 'creep_data':
+            creep_analysis.creep_data_insert(data_manager, parameters['hold_spacing'])
+        elif stage == 'fitting':
+            creep_analysis.compute_creep_fitting(data_manager)
+            profiling.record_fits(data_manager)
+        elif stage == 'area':
+            creep_analysis.area_insert(data_manager, parameters['tip_radius'], parameters['epsilon'])
+        elif stage == 'hardness':
+            creep_analysis.hardness_insert(data_manager)
+        elif stage == 'strain_rate':
+            creep_analysis.strain_rate_insert(data_manager, parameters['step_size'], parameters['strain_rate_estimator'],
+                                              parameters['adaptive_step'], parameters['tip_radius'])
+        elif stage == 'log':
+            creep_analysis.compute_log(data_manager)
+        elif stage == 'srs':
+            creep_analysis.srs_insert(data_manager, parameters['srs_fit_window'])
+
+
+def _snapshot(data_manager, stage, fields):
+    """fields written by stage and the failures it caused, the arrays are shared and never modified"""
+    snapshot = {}
+    for name, case in data_manager.items():
+        failed_here = case.failed_stage == stage
+        if case.ok or failed_here:
+            snapshot[name] = (case.failed_stage if failed_here else None, case.error if failed_here else None,
+                              {field: getattr(case, field) for field in fields})
+    return snapshot
+
+
+def _restore(data_manager, snapshot):
+    for name, (failed_stage, error, values) in snapshot.items():
+        case = data_manager[name]
+        for field, value in values.items():
+            setattr(case, field, value)
+        if failed_stage is not None:
+            case.fail(failed_stage, error)
@@ -0,0 +1,110 @@
+import json
+
+import numpy as np
+
+# pipeline stages in order, a failed case records the first stage it failed at
+STAGES = ('raw_data', 's_value', 'er_value', 'creep_data', 'fitting', 'area', 'hardness', 'strain_rate', 'log',
+          'srs')
+
+RAW_FIELDS = ('time', 'fn', 'pd')
+ARRAY_FIELDS = RAW_FIELDS + ('creep_time', 'creep_displacement', 'creep_load', 'fitted_creep_displacement',
+                             'area', 'sqrt_area', 'hardness', 'strain_rate', 'log_strain_rate', 'log_hardness')
+SCALAR_FIELDS = ('s_value', 'er_value', 'creep_start_idx', 'creep_end_idx',
+                 'creep_time_start', 'creep_displacement_start', 'srs_m', 'srs_intercept')
+
+META_KEY = '__meta__'
+
+
+class CaseResult:
+    """results of one case (experiment case with repetition), every curve is a contiguous float64 array"""
+    __slots__ = ('name', 'group', 'repetition', 'failed_stage', 'error', 'fitting_constants', 'fit_info') \
+        + SCALAR_FIELDS + ARRAY_FIELDS
+
+    def __init__(self, name):
+        self.name = name
+        self.group = '_'.join(name.split("_")[0:-1])
+        self.repetition = int(name.split("_")[-1])
+        self.failed_stage = None
+        self.error = None
+        self.fitting_constants = None
+        self.fit_info = None
+        for field in SCALAR_FIELDS:
+            setattr(self, field, np.nan)
+        self.creep_start_idx = -1
+        self.creep_end_idx = -1
+        for field in ARRAY_FIELDS:
+            setattr(self, field, None)
+
+    @property
+    def ok(self):
+        return self.failed_stage is None
+
+    @property
+    def status(self):
+        return 'ok' if self.ok else f"failed: {self.failed_stage}"
+
+    def fail(self, stage, error):
+        self.failed_stage = stage
+        self.error = str(error)
+
+    def set_array(self, field, values):
+        setattr(self, field, np.ascontiguousarray(values, dtype=float))
+
+    def __repr__(self):
+        return f"CaseResult({self.name!r}, {self.status})"
+
+
+class CreepResults(dict):
+    """case name -> CaseResult in export column order"""
+
+    def __init__(self, case_names=()):
+        super().__init__((name, CaseResult(name)) for name in case_names)
+
+    def ok_cases(self):
+        return [case for case in self.values() if case.ok]
+
+    def failed_cases(self):
+        return [case for case in self.values() if not case.ok]
+
+    def save(self, file_path, include_raw=False):
+        """write every case to one .npz file, raw curves are left out unless include_raw"""
+        meta = []
+        arrays = {}
+        for i, case in enumerate(self.values()):
+            meta.append({'name': case.name,
+                         'failed_stage': case.failed_stage,
+                         'error': case.error,
+                         'fitting_constants': None if case.fitting_constants is None
+                         else [float(value) for value in case.fitting_constants],
+                         'fit_info': case.fit_info,
+                         **{field: _to_json(getattr(case, field)) for field in SCALAR_FIELDS}})
+            for field in ARRAY_FIELDS:
+                values = getattr(case, field)
+                if values is not None and (include_raw or field not in RAW_FIELDS):
+                    arrays[f"{i}/{field}"] = values
+        np.savez(file_path, **{META_KEY: np.array(json.dumps(meta))}, **arrays)
+
+    @classmethod
+    def load(cls, file_path):
+        results = cls()
+        with np.load(file_path, allow_pickle=False) as archive:
+            meta = json.loads(str(archive[META_KEY]))
+            for i, case_meta in enumerate(meta):
+                case = CaseResult(case_meta['name'])
+                case.failed_stage = case_meta['failed_stage']
+                case.error = case_meta['error']
+                if case_meta['fitting_constants'] is not None:
+                    case.fitting_constants = np.array(case_meta['fitting_constants'])
+                case.fit_info = case_meta['fit_info']
+                for field in SCALAR_FIELDS:
+                    setattr(case, field, case_meta[field])
+                for field in ARRAY_FIELDS:
+                    key = f"{i}/{field}"
+                    if key in archive:
+                        setattr(case, field, archive[key])
+                results[case.name] = case
+        return results
+
+
+def _to_json(value):
+    return value.item() if isinstance(value, np.generic) else value
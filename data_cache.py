@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# environment overrides: NANOINDENTATION_CACHE=0 turns the cache off
+CACHE_ENABLED = os.environ.get('NANOINDENTATION_CACHE', '1') != '0'
+CACHE_DIR = os.environ.get('NANOINDENTATION_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'nanoindentation-analysis'))
+CACHE_SIZE_LIMIT = int(os.environ.get('NANOINDENTATION_CACHE_SIZE', 1024 ** 3))  # bytes
+
+HASH_CHUNK_SIZE = 1024 ** 2
+CACHE_FORMAT = 2  # part of every key, entries of an older layout are never read
+META_FILE = 'columns.json'
+
+# value kinds of a mixed column, stored next to its text and numbers
+MISSING, TEXT, FLOAT, INT = range(4)
+
+
+def cached_read(file_path, reader, use_cache=None, **reader_kwargs):
+    """return reader(file_path, **reader_kwargs) from the column cache when the file is unchanged.
+    columns are stored as one .npy file each and loaded memory-mapped, without parsing or copying"""
+    if use_cache is None:
+        use_cache = CACHE_ENABLED
+    if not use_cache:
+        return reader(file_path, **reader_kwargs)
+
+    entry = os.path.join(CACHE_DIR, cache_key(file_path, reader, reader_kwargs))
+    if os.path.isdir(entry):
+        try:
+            data_frame = load_entry(entry)
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(entry, ignore_errors=True)
+        else:
+            os.utime(entry)  # last access time for the LRU limit
+            return data_frame
+
+    data_frame = reader(file_path, **reader_kwargs)
+    try:
+        store_entry(entry, data_frame)
+        prune_cache()
+    except OSError:
+        pass  # a read-only or full cache directory never breaks loading
+    return data_frame
+
+
+def cache_key(file_path, reader, reader_kwargs):
+    """hash of the file path, size, modification time and content together with the reader options"""
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{CACHE_FORMAT}|{file_path}|{stat.st_size}|{stat.st_mtime_ns}|"
+                  f"{reader.__module__}.{reader.__name__}".encode())
+    digest.update(json.dumps(reader_kwargs, sort_keys=True, default=str).encode())
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_entry(entry, data_frame):
+    if not isinstance(data_frame.index, pd.RangeIndex) or data_frame.index.start != 0:
+        return
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=CACHE_DIR, prefix='.tmp-')
+    try:
+        columns = []
+        for i in range(data_frame.shape[1]):
+            column = data_frame.iloc[:, i]
+            if pd.api.types.is_numeric_dtype(column.dtype) or pd.api.types.is_bool_dtype(column.dtype):
+                np.save(os.path.join(temp_dir, f"{i}.npy"), column.to_numpy())
+                columns.append({'name': str(data_frame.columns[i]), 'kind': 'numeric'})
+            else:
+                kinds = _value_kinds(column)
+                if kinds is None:
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                    return  # values that are neither text nor numbers aren't cached
+                values = column.to_numpy(dtype=object)
+                text = np.array([str(v) if k == TEXT else '' for v, k in zip(values, kinds)])
+                np.save(os.path.join(temp_dir, f"{i}.npy"), text)
+                meta = {'name': str(data_frame.columns[i]), 'kind': 'text', 'dtype': str(column.dtype),
+                        'mask': bool((kinds == MISSING).any())}
+                if np.isin(kinds, (FLOAT, INT)).any():
+                    # numbers in a text column keep their type instead of becoming text
+                    numbers = np.array([float(v) if k in (FLOAT, INT) else np.nan for v, k in zip(values, kinds)])
+                    np.save(os.path.join(temp_dir, f"{i}.numbers.npy"), numbers)
+                    np.save(os.path.join(temp_dir, f"{i}.kinds.npy"), kinds)
+                    meta['kind'] = 'mixed'
+                elif meta['mask']:
+                    np.save(os.path.join(temp_dir, f"{i}.mask.npy"), kinds == MISSING)
+                columns.append(meta)
+
+        with open(os.path.join(temp_dir, META_FILE), 'w') as file:
+            json.dump({'length': len(data_frame), 'columns': columns}, file)
+
+        os.rename(temp_dir, entry)  # atomic, a concurrent writer of the same entry simply loses
+    except OSError:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if not os.path.isdir(entry):
+            raise
+
+
+def load_entry(entry):
+    with open(os.path.join(entry, META_FILE)) as file:
+        meta = json.load(file)
+
+    data = {}
+    for i, column in enumerate(meta['columns']):
+        values = np.load(os.path.join(entry, f"{i}.npy"), mmap_mode='c').view(np.ndarray)  # copy-on-write mapping
+        if column['kind'] == 'text':
+            values = values.astype(object)
+            if column['mask']:
+                values[np.load(os.path.join(entry, f"{i}.mask.npy"))] = np.nan
+        elif column['kind'] == 'mixed':
+            values = values.astype(object)
+            kinds = np.load(os.path.join(entry, f"{i}.kinds.npy"))
+            numbers = np.load(os.path.join(entry, f"{i}.numbers.npy"))
+            values[kinds == MISSING] = np.nan
+            values[kinds == FLOAT] = numbers[kinds == FLOAT].tolist()
+            values[kinds == INT] = numbers[kinds == INT].astype(np.int64).tolist()
+        if column['kind'] != 'numeric':
+            values = pd.array(values, dtype=column.get('dtype', 'object'))
+        data[i] = values
+
+    data_frame = pd.DataFrame(data, copy=False)
+    data_frame.columns = [column['name'] for column in meta['columns']]
+    if len(data_frame) != meta['length']:
+        raise ValueError(f"corrupted cache entry {entry}")
+    return data_frame
+
+
+def _value_kinds(column):
+    """MISSING, TEXT, FLOAT or INT of every value of an object or string column, None when a value is neither"""
+    kinds = np.empty(len(column), dtype=np.int8)
+    for j, (value, missing) in enumerate(zip(column.to_numpy(dtype=object), column.isna().to_numpy())):
+        if missing:
+            kinds[j] = MISSING
+        elif isinstance(value, str):
+            kinds[j] = TEXT
+        elif isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_)) \
+                and abs(int(value)) < 2 ** 53:
+            kinds[j] = INT
+        elif isinstance(value, (float, np.floating)):
+            kinds[j] = FLOAT
+        else:
+            return None
+    return kinds
+
+
+def prune_cache(size_limit=None):
+    """remove least recently used entries until the cache directory fits in size_limit bytes"""
+    if size_limit is None:
+        size_limit = CACHE_SIZE_LIMIT
+    if not os.path.isdir(CACHE_DIR):
+        return
+
+    entries = []
+    total_size = 0
+    for name in os.listdir(CACHE_DIR):
+        entry = os.path.join(CACHE_DIR, name)
+        if name.startswith('.') or not os.path.isdir(entry):
+            continue
+        size = sum(f.stat().st_size for f in os.scandir(entry))
+        entries.append((os.stat(entry).st_mtime, size, entry))
+        total_size += size
+
+    for _, size, entry in sorted(entries):
+        if total_size <= size_limit:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total_size -= size
+
+
+def clear_cache():
+    shutil.rmtree(CACHE_DIR, ignore_errors=True)
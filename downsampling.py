@@ -0,0 +1,117 @@
+import numpy as np
+
+DEFAULT_POINTS = 2000  # points drawn per curve, about the width of a plot in pixels
+MINMAX_RATIO = 4  # min/max candidates per output point handed to LTTB
+
+
+def downsample_indices(x, y, n_out=DEFAULT_POINTS, minmax_ratio=MINMAX_RATIO):
+    """return sorted indices of at most n_out points that keep the shape of the curve (MinMaxLTTB).
+    every bucket of the curve first contributes its minimum and maximum, so narrow peaks like pop-ins
+    survive, then largest-triangle-three-buckets picks the drawn points among those candidates"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(finite) <= n_out:
+        return finite
+
+    candidates = finite[_minmax_indices(y[finite], n_out * minmax_ratio // 2)]
+    if len(candidates) <= n_out:
+        return candidates
+    return candidates[lttb_indices(x[candidates], y[candidates], n_out)]
+
+
+def downsample(x, y, n_out=DEFAULT_POINTS):
+    """return x and y reduced to at most n_out points with downsample_indices"""
+    idx = downsample_indices(x, y, n_out)
+    return np.asarray(x, dtype=float)[idx], np.asarray(y, dtype=float)[idx]
+
+
+def lttb_indices(x, y, n_out):
+    """largest-triangle-three-buckets: keep the first and last point and from every bucket in between
+    the point spanning the largest triangle with the previous choice and the next bucket's mean"""
+    length = len(x)
+    if n_out >= length or n_out < 3:
+        return np.arange(length)
+
+    edges = np.linspace(1, length - 1, n_out - 1).astype(int)
+    x_means = np.add.reduceat(x[1:-1], edges[:-1] - 1) / np.diff(edges)
+    y_means = np.add.reduceat(y[1:-1], edges[:-1] - 1) / np.diff(edges)
+    x_means = np.append(x_means, x[-1])
+    y_means = np.append(y_means, y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = length - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        areas = np.abs((x[previous] - x_means[i + 1]) * (y[start:stop] - y[previous])
+                       - (x[previous] - x[start:stop]) * (y_means[i + 1] - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+def _minmax_indices(y, n_buckets):
+    """first, last and the minimum and maximum of n_buckets index buckets covering every point, the bucket
+    sizes differ by at most one so no part of the curve gets more candidates than another"""
+    length = len(y)
+    n_buckets = max(1, min(n_buckets, length // 2))  # buckets of at least two points
+    edges = np.linspace(0, length, n_buckets + 1).astype(int)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    # sorted by bucket and then by value, the first point of every bucket is its minimum or maximum
+    lowest = np.lexsort((y, bucket))[edges[:-1]]
+    highest = np.lexsort((-y, bucket))[edges[:-1]]
+    return np.unique(np.concatenate([[0, length - 1], lowest, highest]))
+
+
+class LODLine:
+    """Line2D drawing a downsampled dense curve, resampled at full detail for the visible x range on zoom"""
+
+    def __init__(self, ax, x, y, *args, n_out=DEFAULT_POINTS, **kwargs):
+        self.ax = ax
+        self.n_out = n_out
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.extent_idx = self._extent_indices()
+        self.view = None
+
+        idx = downsample_indices(self.x, self.y, n_out)
+        self.line, = ax.plot(self.x[idx], self.y[idx], *args, **kwargs)
+        self._callback = ax.callbacks.connect('xlim_changed', self.resample)
+
+    def resample(self, ax=None):
+        if not self.line.get_visible():
+            return
+        x_min, x_max = self.ax.get_xlim()
+        if self.view == (x_min, x_max):
+            return
+        self.view = (x_min, x_max)
+
+        visible = (self.x >= x_min) & (self.x <= x_max)
+        visible[1:] |= visible[:-1]  # keep the neighbours so the line reaches the plot edges
+        visible[:-1] |= visible[1:]
+        visible_idx = np.flatnonzero(visible)
+        idx = visible_idx[downsample_indices(self.x[visible_idx], self.y[visible_idx], self.n_out)]
+        # the extreme x points keep the data limits of the line unchanged for autoscaling
+        idx = np.union1d(idx, self.extent_idx)
+        self.line.set_data(self.x[idx], self.y[idx])
+
+    def set_visible(self, visible):
+        self.line.set_visible(visible)
+        if visible:
+            self.view = None
+            self.resample()
+
+    def get_visible(self):
+        return self.line.get_visible()
+
+    def remove(self):
+        self.ax.callbacks.disconnect(self._callback)
+        self.line.remove()
+
+    def _extent_indices(self):
+        finite = np.flatnonzero(np.isfinite(self.x) & np.isfinite(self.y))
+        if len(finite) == 0:
+            return finite
+        return np.unique([finite[np.argmin(self.x[finite])], finite[np.argmax(self.x[finite])]])
@@ -1,18 +1,335 @@
+import re
+from collections import namedtuple
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 
+import data_cache
+
+# X_<case>_<repetition>_<quantity>_<unit>, pandas appends .1, .2, ... to duplicated headers
+COLUMN_PATTERN = re.compile(r"^(?P<axis>[XY])_(?P<case>.+)_(?P<repetition>\d+)_(?P<quantity>[^_]+)_(?P<unit>\[[^\]]*\])(\.\d+)?$")
+
+ColumnKey = namedtuple('ColumnKey', ['position', 'axis', 'material', 'grain', 'strain_rate',
+                                     'repetition', 'quantity', 'unit', 'curve'])
+
+CHUNK_SIZE = 100000  # rows parsed at once by the streaming reader
+
+
+def txt_to_df(file_path, use_cache=None, **kwargs):
+    return data_cache.cached_read(file_path, pd.read_csv, use_cache, sep='\t', **kwargs)
+
+
+def xlsx_to_df(file_path, sheet_name=0, use_cache=None):
+    return data_cache.cached_read(file_path, pd.read_excel, use_cache, sheet_name=sheet_name)
+
+
+def read_schema(file_path, **kwargs):
+    """return the ExportSchema of an export from its header line only"""
+    return ExportSchema(pd.read_csv(file_path, sep='\t', nrows=0, **kwargs))
+
+
+def iter_curve_chunks(file_path, curves=None, chunksize=CHUNK_SIZE, dtype=None, schema=None, **kwargs):
+    """stream an export in blocks of chunksize rows and yield {(curve, quantity, axis): array} per block.
+    only the columns of the given curves (every curve by default) are parsed, and only the first column of
+    each (curve, quantity, axis), so the time column repeated in front of every Y column is never read.
+    dtype, e.g. np.float32, is applied while parsing"""
+    if schema is None:
+        schema = read_schema(file_path, **kwargs)
+    columns = schema.curve_columns(curves)
+    labels = [schema.data.columns[position] for position in columns.values()]
+    dtypes = None if dtype is None else dict.fromkeys(labels, dtype)
+
+    reader = pd.read_csv(file_path, sep='\t', usecols=labels, dtype=dtypes, chunksize=chunksize, **kwargs)
+    with reader:
+        for chunk in reader:
+            yield {key: chunk[label].to_numpy() for key, label in zip(columns, labels)}
+
+
+def read_curves(file_path, curves=None, chunksize=CHUNK_SIZE, dtype=None, schema=None, **kwargs):
+    """return CurveColumns with the curves of an export read by iter_curve_chunks,
+    the wide frame of the whole export is never built"""
+    if schema is None:
+        schema = read_schema(file_path, **kwargs)
+    blocks = {key: [] for key in schema.curve_columns(curves)}
+    for chunk in iter_curve_chunks(file_path, curves, chunksize, dtype, schema, **kwargs):
+        for key, values in chunk.items():
+            blocks[key].append(values)
+    return CurveColumns({key: np.concatenate(values) if values else np.empty(0, dtype=dtype or float)
+                         for key, values in blocks.items()})
 
-def txt_to_df(file_path):
-    return pd.read_csv(file_path, sep='\t')
+
+def iter_xlsx_rows(file_path, sheet_name=0, chunksize=CHUNK_SIZE, min_row=1, max_row=None):
+    """stream a workbook sheet (by name or index) with openpyxl's read-only reader and yield lists of up to
+    chunksize row value tuples, the sheet xml is parsed row by row and never held whole"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if isinstance(sheet_name, str) else workbook.worksheets[sheet_name]
+        rows = []
+        for row in sheet.iter_rows(min_row=min_row, max_row=max_row, values_only=True):
+            rows.append(row)
+            if len(rows) == chunksize:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+    finally:
+        workbook.close()
+
+
+def iter_xlsx_curve_chunks(file_path, sheet_name=0, curves=None, chunksize=CHUNK_SIZE, dtype=None):
+    """iter_curve_chunks for a sheet holding an export (X_<case>_<repetition>_<quantity>_<unit> header row),
+    empty cells become NaN"""
+    chunks = iter_xlsx_rows(file_path, sheet_name, chunksize)
+    rows = next(chunks, [])
+    if not rows:
+        return
+    columns = ExportSchema(pd.DataFrame(columns=list(rows[0]))).curve_columns(curves)
+    positions = np.array(list(columns.values()), dtype=int)
+
+    rows = rows[1:]  # the header row opened the first chunk
+    while True:
+        if rows:
+            block = np.array(rows, dtype=float)[:, positions].astype(dtype or float, copy=False)
+            yield {key: block[:, i] for i, key in enumerate(columns)}
+        rows = next(chunks, None)
+        if rows is None:
+            return
+
+
+def read_xlsx_curves(file_path, sheet_name=0, curves=None, chunksize=CHUNK_SIZE, dtype=None):
+    """return CurveColumns with the curves of an export sheet read by iter_xlsx_curve_chunks"""
+    blocks = {}
+    for chunk in iter_xlsx_curve_chunks(file_path, sheet_name, curves, chunksize, dtype):
+        for key, values in chunk.items():
+            blocks.setdefault(key, []).append(values)
+    return CurveColumns({key: np.concatenate(values) for key, values in blocks.items()})
+
+
+def read_xlsx_report(file_path, sheet_name='data'):
+    """return the O&P report sheet of a workbook ('HIT (O&P)' / '[GPa]' / 'Data : 2' ... rows under the group
+    name) as a Group, Measurement, Parameter, Unit, Value table like the *_data.TXT exports"""
+    records = []
+    units = {}
+    group = parameter = None
+    for rows in iter_xlsx_rows(file_path, sheet_name):
+        for row in rows:
+            first, label, value = (tuple(row) + (None,) * 3)[:3]
+            if label is None and isinstance(value, str):
+                group = value
+            elif isinstance(label, str) and label.startswith('Data :'):
+                if isinstance(first, str) and first.startswith('['):
+                    units[parameter] = first.strip('[]')
+                elif isinstance(first, str):
+                    parameter = first
+                records.append((group, int(label.split(':')[1]), parameter, value))
+    table = pd.DataFrame(records, columns=['Group', 'Measurement', 'Parameter', 'Value'])
+    table.insert(3, 'Unit', table['Parameter'].map(units).fillna(''))
+    return table
 
 
 def return_curves_name_array(dataframe):
-    columns = dataframe.columns
-    curves_name_array = []
-    for i in range(0, len(columns)-1, 2):
-        curves_name_array.append(columns[i][2:][:-8])
-    return curves_name_array
+    return ExportSchema(dataframe).curve_names
+
+
+class ExportSchema:
+    """column layout of an exported curve file, parsed once and indexed by
+    (material, grain, strain rate, repetition, quantity)"""
+
+    def __init__(self, dataframe):
+        self.data = dataframe
+        self.keys = []
+        self.curve_names = []
+        self._curve_index = {}  # (curve, quantity, axis) -> position
+        self._group_index = {}  # (material, grain, strain_rate, quantity, axis) -> positions ordered by repetition
+        self._array = None
+
+        for position, column in enumerate(dataframe.columns):
+            key = parse_column(position, column)
+            if key is None:
+                continue
+            self.keys.append(key)
+            self._curve_index.setdefault((key.curve, key.quantity, key.axis), position)
+            self._group_index.setdefault((key.material, key.grain, key.strain_rate, key.quantity, key.axis), [])
+            self._group_index[(key.material, key.grain, key.strain_rate, key.quantity, key.axis)].append(key)
+
+        seen = set()
+        for key in self.keys:
+            if key.curve not in seen:
+                seen.add(key.curve)
+                self.curve_names.append(key.curve)
+
+        for group, keys in self._group_index.items():
+            keys = sorted(keys, key=lambda k: k.repetition)
+            positions = []
+            repetitions = set()
+            for k in keys:
+                if k.repetition not in repetitions:  # skip duplicated time columns
+                    repetitions.add(k.repetition)
+                    positions.append(k.position)
+            self._group_index[group] = _compact_positions(positions)
+
+    def column(self, curve, quantity, axis=None):
+        """return the column label of one quantity of a curve"""
+        return self.data.columns[self.position(curve, quantity, axis)]
+
+    def position(self, curve, quantity, axis=None):
+        if axis is None:
+            for axis in ('X', 'Y'):
+                if (curve, quantity, axis) in self._curve_index:
+                    break
+        return self._curve_index[(curve, quantity, axis)]
+
+    def positions(self, quantity, axis, material=None, grain=None, strain_rate=None):
+        """return column positions of every repetition in a group as a slice when they are evenly spaced"""
+        if grain is not None:
+            grain = str(grain)
+        return self._group_index[(material, grain, strain_rate, quantity, axis)]
+
+    def groups(self):
+        """return (material, grain, strain_rate) of every group in column order"""
+        groups = []
+        for key in self.keys:
+            group = (key.material, key.grain, key.strain_rate)
+            if group not in groups:
+                groups.append(group)
+        return groups
+
+    def repetitions(self, material=None, grain=None, strain_rate=None):
+        if grain is not None:
+            grain = str(grain)
+        return sorted({key.repetition for key in self.keys
+                       if (key.material, key.grain, key.strain_rate) == (material, grain, strain_rate)})
+
+    def group_curves(self, material=None, grain=None, strain_rate=None):
+        """return curve names of every repetition in a group, ordered by repetition"""
+        if grain is not None:
+            grain = str(grain)
+        curves = {key.repetition: key.curve for key in self.keys
+                  if (key.material, key.grain, key.strain_rate) == (material, grain, strain_rate)}
+        return [curves[repetition] for repetition in sorted(curves)]
+
+    def values(self, quantity, axis, material=None, grain=None, strain_rate=None):
+        """return a (repetitions, samples) array of one quantity for every repetition of a group,
+        each row is a contiguous view of a column when the group columns are evenly spaced"""
+        return self.array[self.positions(quantity, axis, material, grain, strain_rate)]
+
+    def curve_values(self, curve, quantity, axis=None):
+        return self.array[self.position(curve, quantity, axis)]
+
+    def curve_columns(self, curves=None):
+        """return {(curve, quantity, axis): position} of the first column of every quantity of the curves"""
+        if curves is None:
+            return dict(self._curve_index)
+        curves = set(curves)
+        return {key: position for key, position in self._curve_index.items() if key[0] in curves}
+
+    @property
+    def array(self):
+        """column-major copy of the data, one contiguous row per column"""
+        if self._array is None:
+            self._array = np.ascontiguousarray(self.data.to_numpy(dtype=float).T)
+        return self._array
+
+
+class CurveColumns:
+    """curves of an export kept as separate column arrays, read by read_curves.
+    answers curve_names and curve_values like ExportSchema"""
+
+    def __init__(self, columns):
+        self.columns = columns  # (curve, quantity, axis) -> array
+        self.curve_names = list(dict.fromkeys(curve for curve, _, _ in columns))
+
+    def curve_values(self, curve, quantity, axis=None):
+        if axis is None:
+            for axis in ('X', 'Y'):
+                if (curve, quantity, axis) in self.columns:
+                    break
+        return self.columns[(curve, quantity, axis)]
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values())
+
+
+class ParameterTable:
+    """O&P parameter export (Group, Measurement, Parameter, Unit, Value) indexed by
+    (group, measurement, parameter) for constant time lookups"""
+
+    def __init__(self, dataframe):
+        groups = dataframe['Group'].to_numpy(dtype=object)
+        measurements = dataframe['Measurement'].to_numpy(dtype=int)
+        parameters = dataframe['Parameter'].to_numpy(dtype=object)
+        values = dataframe['Value'].to_numpy(dtype=float)
+
+        self.values = {}
+        for key in zip(groups, measurements.tolist(), parameters, values.tolist()):
+            self.values.setdefault(key[:3], key[3])  # the first row wins like .values[0] did
+
+        self.units = dict(zip(dataframe['Parameter'], dataframe['Unit']))
+        self.table = pd.DataFrame({'Group': groups, 'Measurement': measurements,
+                                   'Parameter': parameters, 'Value': values}) \
+            .drop_duplicates(['Group', 'Measurement', 'Parameter']) \
+            .pivot(index=['Group', 'Measurement'], columns='Parameter', values='Value')
+
+    def parameter_name(self, parameter):
+        """accept short names like HIT or hc for HIT (O&P) and hc (O&P)"""
+        if parameter not in self.units and f"{parameter} (O&P)" in self.units:
+            return f"{parameter} (O&P)"
+        return parameter
+
+    def get(self, group, measurement, parameter):
+        """return one parameter value, raise KeyError when the measurement has no such parameter"""
+        return self.values[(group, int(measurement), self.parameter_name(parameter))]
+
+    def parameter(self, parameter, group=None):
+        """return one parameter of every measurement as a Series indexed by (Group, Measurement),
+        or by Measurement when group is given"""
+        column = self.table[self.parameter_name(parameter)]
+        if group is not None:
+            column = column.xs(group, level='Group')
+        return column.dropna()
+
+    def measurements(self, group):
+        return self.table.xs(group, level='Group').index.tolist()
+
+    def groups(self):
+        return self.table.index.get_level_values('Group').unique().tolist()
+
+
+def parse_column(position, column):
+    """return ColumnKey of a column header or None when it doesn't follow the export naming"""
+    match = COLUMN_PATTERN.match(str(column))
+    if match is None:
+        return None
+
+    case = match.group('case')
+    repetition = int(match.group('repetition'))
+    material, grain, strain_rate = parse_case(case)
+
+    return ColumnKey(position, match.group('axis'), material, grain, strain_rate,
+                     repetition, match.group('quantity'), match.group('unit'), f"{case}_{repetition}")
 
 
+def parse_case(case):
+    """split an experiment case into material, grain and strain rate, e.g. Mg_1299_0.005.
+    cases without a trailing strain rate (HT_V_300mN) are kept whole as the material"""
+    split_name = case.split("_")
+    if len(split_name) >= 3:
+        try:
+            strain_rate = float(split_name[-1])
+        except ValueError:
+            pass
+        else:
+            return '_'.join(split_name[:-2]), split_name[-2], strain_rate
+    return case, None, None
 
 
+def _compact_positions(positions):
+    if len(positions) == 1:
+        return slice(positions[0], positions[0] + 1)
+    step = positions[1] - positions[0]
+    if step > 0 and all(b - a == step for a, b in zip(positions, positions[1:])):
+        return slice(positions[0], positions[-1] + 1, step)
+    return np.array(positions)
@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+
+import creep_analysis
+import file_manager
+
+GRID_TOLERANCE = 5.0  # um, stage positions closer than this along an axis share a grid line
+# stage position units of the exports in um, the micro sign may come out as any character but an ascii letter
+POSITION_UNITS = {'nm': 1e-3, 'um': 1.0, 'mm': 1e3, 'cm': 1e4, '': 1.0}
+
+BETA = 1.0  # correction factor of the O&P reduced modulus, the example exports use 1 (1.034 for a Berkovich tip)
+INDENTER_MODULUS = 1141.0  # GPa, diamond
+INDENTER_POISSON = 0.07
+
+AGGREGATE_COLUMNS = ['mean', 'std', 'min', 'max', 'count']
+
+
+def op_properties(max_load, stiffness, contact_area, poisson, beta=BETA, indenter_modulus=INDENTER_MODULUS,
+                  indenter_poisson=INDENTER_POISSON):
+    """hardness, reduced modulus and indentation modulus in GPa of any number of indents at once from the
+    O&P max load (mN), contact stiffness (mN/nm), projected contact area (nm^2) and sample poisson ratio"""
+    max_load, stiffness, contact_area, poisson = np.broadcast_arrays(
+        *(np.asarray(values, dtype=float) for values in (max_load, stiffness, contact_area, poisson)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hardness = max_load / contact_area * 1e6  # mN/nm^2 -> GPa
+        reduced_modulus = np.sqrt(np.pi) / (2 * beta) * stiffness / np.sqrt(contact_area) * 1e6
+        modulus = (1 - poisson ** 2) / (1 / reduced_modulus - (1 - indenter_poisson ** 2) / indenter_modulus)
+    return {'hardness': hardness, 'reduced_modulus': reduced_modulus, 'modulus': modulus}
+
+
+def position_scale(unit):
+    """factor converting a stage position unit of an export to um"""
+    unit = str(unit).strip()
+    if len(unit) == 2 and unit.endswith('m') and not (unit[0].isascii() and unit[0].isalpha()):
+        unit = 'um'
+    if unit not in POSITION_UNITS:
+        raise ValueError(f"unknown stage position unit {unit!r}")
+    return POSITION_UNITS[unit]
+
+
+def grid_axis(values, tolerance=GRID_TOLERANCE):
+    """snap stage coordinates to grid lines, return the line positions (mean of their members) and the line
+    index of every value. values further apart than tolerance after sorting start a new line"""
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return np.empty(0), np.empty(0, dtype=int)
+    order = np.argsort(values, kind='stable')
+    lines = np.concatenate([[0], np.cumsum(np.diff(values[order]) > tolerance)])
+    index = np.empty(len(values), dtype=int)
+    index[order] = lines
+    return np.bincount(lines, values[order]) / np.bincount(lines), index
+
+
+class IndentationMap:
+    """indents of a grid as flat per indent arrays (group, measurement, grain, x, y, row, col and fields such as
+    hardness, modulus or m) with the stage positions snapped to grid rows (y) and columns (x).
+    grid() lays a field out as a (rows, cols) array, aggregate() reduces a field per grain, group or region"""
+
+    def __init__(self, groups, measurements, x, y, fields=None, tolerance=GRID_TOLERANCE):
+        self.index = pd.MultiIndex.from_arrays([np.asarray(groups, dtype=object), np.asarray(measurements, dtype=int)],
+                                               names=['Group', 'Measurement'])
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.x_lines, self.col = grid_axis(self.x, tolerance)
+        self.y_lines, self.row = grid_axis(self.y, tolerance)
+        # grain ID from the case name (Mg_1299_0.005 -> 1299), None for cases without one
+        self.grain = np.array([file_manager.parse_case(group)[1] for group in self.group], dtype=object)
+        self.fields = {name: np.asarray(values, dtype=float) for name, values in (fields or {}).items()}
+
+    @classmethod
+    def from_parameters(cls, stiffness_data, groups=None, parameters=(), tolerance=GRID_TOLERANCE, **op_kwargs):
+        """map of every measurement with a stage position in an O&P parameter export (*_data.TXT),
+        hardness and moduli come from op_properties, parameters adds raw columns like 'hc' or 'HIT'"""
+        if not isinstance(stiffness_data, file_manager.ParameterTable):
+            stiffness_data = file_manager.ParameterTable(stiffness_data)
+        table = stiffness_data.table.dropna(subset=['X', 'Y'])
+        if groups is not None:
+            table = table[table.index.get_level_values('Group').isin(list(groups))]
+
+        def column(parameter):
+            name = stiffness_data.parameter_name(parameter)
+            if name not in table:
+                return np.full(len(table), np.nan)
+            return table[name].to_numpy(dtype=float)
+
+        fields = op_properties(column('Fm'), column('S'), column('Ap'), column("Poisson's ratio"), **op_kwargs)
+        for parameter in parameters:
+            fields[parameter] = column(parameter)
+        return cls(table.index.get_level_values('Group'), table.index.get_level_values('Measurement'),
+                   column('X') * position_scale(stiffness_data.units.get('X', '')),
+                   column('Y') * position_scale(stiffness_data.units.get('Y', '')), fields, tolerance)
+
+    @classmethod
+    def from_experiment(cls, hardness_time_data, stiffness_data, groups=None, parameters=(),
+                        tolerance=GRID_TOLERANCE, **create_kwargs):
+        """from_parameters with m and n of every indent whose creep curve is in the export, all curves are
+        analysed by one create_data_manager call"""
+        indentation_map = cls.from_parameters(stiffness_data, groups, parameters, tolerance)
+        indentation_map.add_srs(creep_analysis.create_data_manager(hardness_time_data, stiffness_data,
+                                                                   **create_kwargs))
+        return indentation_map
+
+    @property
+    def group(self):
+        return self.index.get_level_values('Group').to_numpy(dtype=object)
+
+    @property
+    def measurement(self):
+        return self.index.get_level_values('Measurement').to_numpy(dtype=int)
+
+    @property
+    def shape(self):
+        return len(self.y_lines), len(self.x_lines)
+
+    def __len__(self):
+        return len(self.index)
+
+    def add_field(self, name, values):
+        values = np.asarray(values, dtype=float)
+        if values.shape != (len(self),):
+            raise ValueError(f"{name} has shape {values.shape}, expected ({len(self)},)")
+        self.fields[name] = values
+
+    def add_case_values(self, name, cases, values):
+        """add a field from per case values, cases are curve names (HT_V_100mN_3) or (group, measurement)
+        pairs, indents without a value get NaN"""
+        pairs = [case if isinstance(case, tuple) else (case.rsplit("_", 1)[0], int(case.rsplit("_", 1)[1]))
+                 for case in cases]
+        positions = self.index.get_indexer(pd.MultiIndex.from_tuples(pairs)) if pairs else np.empty(0, dtype=int)
+        field = np.full(len(self), np.nan)
+        found = positions >= 0
+        field[positions[found]] = np.asarray(values, dtype=float)[found]
+        self.fields[name] = field
+
+    def add_srs(self, data_manager):
+        """m and n = 1/m of every indent fitted by creep_analysis.srs_insert"""
+        cases = data_manager.ok_cases()
+        self.add_case_values('m', [(case.group, case.repetition) for case in cases],
+                             [case.srs_m for case in cases])
+        with np.errstate(divide='ignore'):
+            self.fields['n'] = 1 / self.fields['m']
+
+    def set_grains(self, grains):
+        """grain IDs per indent, or a (rows, cols) grain ID array like a segmented EBSD map on the grid"""
+        grains = np.asarray(grains, dtype=object)
+        if grains.shape == self.shape:
+            grains = grains[self.row, self.col]
+        if grains.shape != (len(self),):
+            raise ValueError(f"grains have shape {grains.shape}, expected ({len(self)},) or {self.shape}")
+        self.grain = grains
+
+    def grid(self, field, statistic='mean'):
+        """(rows, cols) array of a field, NaN where the grid has no indent. indents sharing a cell are averaged,
+        or counted with statistic='count'"""
+        cell = self.row * len(self.x_lines) + self.col
+        values = self.fields[field]
+        finite = np.isfinite(values)
+        count = np.bincount(cell[finite], minlength=self.shape[0] * self.shape[1])
+        if statistic == 'count':
+            return count.reshape(self.shape)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (np.bincount(cell[finite], values[finite], minlength=len(count)) / count).reshape(self.shape)
+
+    def region(self, x_min=-np.inf, x_max=np.inf, y_min=-np.inf, y_max=np.inf):
+        """boolean mask of the indents inside a stage rectangle"""
+        return (self.x >= x_min) & (self.x <= x_max) & (self.y >= y_min) & (self.y <= y_max)
+
+    def aggregate(self, field, by='grain', mask=None):
+        """mean, std, min, max and count of a field per label as a DataFrame, NaN values are left out.
+        by is 'grain', 'group', None for one row of everything, a per indent label array or a (rows, cols)
+        label array such as region IDs. mask (e.g. region()) limits the indents. 'grain' falls back to
+        'group' when no indent has a grain ID, as in exports without grain numbers in the case names"""
+        values = self.fields[field]
+        if isinstance(by, str) and by == 'grain' and all(grain is None for grain in self.grain):
+            by = 'group'
+        if by is None:
+            labels = np.zeros(len(self), dtype=int)
+        elif isinstance(by, str):
+            labels = self.grain if by == 'grain' else self.group
+        else:
+            labels = np.asarray(by)
+            if labels.shape == self.shape:
+                labels = labels[self.row, self.col]
+
+        keep = np.isfinite(values)
+        if mask is not None:
+            keep &= np.asarray(mask, dtype=bool)
+        codes, names = pd.factorize(labels[keep])
+        values = values[keep][codes >= 0]
+        codes = codes[codes >= 0]  # unlabelled indents
+
+        count = np.bincount(codes, minlength=len(names))
+        mean = np.bincount(codes, values, minlength=len(names)) / count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            std = np.sqrt(np.bincount(codes, (values - mean[codes]) ** 2, minlength=len(names)) / (count - 1))
+        low = np.full(len(names), np.inf)
+        high = np.full(len(names), -np.inf)
+        np.minimum.at(low, codes, values)
+        np.maximum.at(high, codes, values)
+        table = pd.DataFrame({'mean': mean, 'std': std, 'min': low, 'max': high, 'count': count},
+                             index=pd.Index(names, name=by if isinstance(by, str) else None))
+        return table[AGGREGATE_COLUMNS]
+
+    def table(self):
+        """one row per indent with its labels, position, grid cell and fields"""
+        return pd.DataFrame({'group': self.group, 'measurement': self.measurement, 'grain': self.grain,
+                             'x': self.x, 'y': self.y, 'row': self.row, 'col': self.col, **self.fields})
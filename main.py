@@ -1,11 +1,13 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
+
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from tkinter import *
 from tkinter import filedialog
 
-import file_manager
 import analyzer
+import downsampling
+import session
 
 WINDOW_TITLE = "Nano-indentation Analysis"
 WINDOW_GEOMETRY = "1000x800"
@@ -13,6 +15,8 @@ FILETYPES = (
     ('text files', '*.txt'),
     ('All files', '*.*'))
 FIGSIZE = (8, 4)
+POLL_INTERVAL = 50  # ms between checks of background tasks
+WORKERS = 2
 
 
 class NanoindentationAnalysis:
@@ -25,6 +29,7 @@ class NanoindentationAnalysis:
         self.first_direction_label = Label(text="1. Open a file to be analyzed")
         self.second_direction_label = Label(text="2. Select Curves")
         self.selected_file_label = Label(text="no data", width=20, bg='#eeeeee')
+        self.status_label = Label(text="", width=20, fg='#555555')
 
         # entry
         self.entry_strain_rate1 = Entry(self.window, width=10)
@@ -42,6 +47,8 @@ class NanoindentationAnalysis:
         self.plot_update_btn1 = Button(self.window, text="Plot Update", command=self.update_button1)
         self.curves_merging_btn = Button(self.window, text="Merging and averaging", width=20,
                                          command=self.merging_curve_button)
+        self.merge_mode = StringVar(self.window, value=analyzer.MERGE_MODES[0])
+        self.merge_mode_menu = OptionMenu(self.window, self.merge_mode, *analyzer.MERGE_MODES)
 
         self.add_btn1 = Button(self.window, text='Add1', width=8, command=self.add1_btn_clicked)
         self.add_btn2 = Button(self.window, text='Add2', width=8, command=self.add2_btn_clicked)
@@ -53,17 +60,28 @@ class NanoindentationAnalysis:
         # listbox
         self.list_box_1 = Listbox(self.window, selectmode="multiple", height=5)
 
-        # pre-created figures
-        self.selected_list_preview = []
+        # pre-created figures, artists are updated in place afterwards
+        self.selected_list_preview = []  # (file key, curve) entries of the session
         self.legend = None
+        self.curve_lines = {}  # (file key, curve) -> downsampling.LODLine on ax1
+        self.merged_artists = None  # (Line2D, PolyCollection) of the current merged curve on ax1
+        self.combined_artists = {}  # strain rate -> (Line2D, PolyCollection) on ax2
+        self.combined_plotted = {}  # strain rate -> merged DataFrame currently drawn on ax2
         self.create_figure()
+        self.plot_setting()
         self.top_plot_update()
         self.botton_plot_update()
 
+        # background tasks, only the newest task of each kind delivers its result
+        self.executor = ThreadPoolExecutor(max_workers=WORKERS)
+        self.task_generations = {}  # kind -> generation of the newest task
+        self.pending_tasks = {}  # kind -> future of the newest task
+
         # etc
         self.filename = None
-        self.data = None
-        self.combined_plot_dict = {}
+        self.session = session.Session()
+        self.listed_entries = []  # session entries in list_box_1 order
+        self.combined_plot_dict = {}  # strain rate -> merged DataFrame, shared with the session cache
 
         # init
         self.window_init_setting()
@@ -76,31 +94,35 @@ class NanoindentationAnalysis:
         self.first_direction_label.place(x=10, y=10)
         self.file_selection_btn.place(x=10, y=35)
         self.selected_file_label.place(x=10, y=60)
+        self.status_label.place(x=10, y=82)
 
         # second direction
         self.second_direction_label.place(x=10, y=105)
         self.plot_update_btn1.place(x=120, y=105)
         self.list_box_1.place(x=10, y=130)
+        self.list_box_1.bind('<<ListboxSelect>>', lambda event: self.update_button1())
         self.curves_merging_btn.place(x=10, y=230)
-
-        self.entry_strain_rate1.place(x=10, y=260)
-        self.add_btn1.place(x=120, y=262)
-        self.entry_strain_rate2.place(x=10, y=290)
-        self.add_btn2.place(x=120, y=292)
-        self.entry_strain_rate3.place(x=10, y=320)
-        self.add_btn3.place(x=120, y=322)
-        self.entry_strain_rate4.place(x=10, y=350)
-        self.add_btn4.place(x=120, y=352)
-        self.plot_update_btn2.place(x=10, y=382)
+        self.merge_mode_menu.place(x=10, y=258)
+
+        self.entry_strain_rate1.place(x=10, y=290)
+        self.add_btn1.place(x=120, y=292)
+        self.entry_strain_rate2.place(x=10, y=320)
+        self.add_btn2.place(x=120, y=322)
+        self.entry_strain_rate3.place(x=10, y=350)
+        self.add_btn3.place(x=120, y=352)
+        self.entry_strain_rate4.place(x=10, y=380)
+        self.add_btn4.place(x=120, y=382)
+        self.plot_update_btn2.place(x=10, y=412)
 
     def create_figure(self):
-        self.fig1 = plt.Figure(figsize=FIGSIZE, dpi=100, facecolor='grey')
-        self.fig2 = plt.Figure(figsize=FIGSIZE, dpi=100, facecolor='grey')
+        self.fig1 = Figure(figsize=FIGSIZE, dpi=100, facecolor='grey')
+        self.fig2 = Figure(figsize=FIGSIZE, dpi=100, facecolor='grey')
         self.ax1 = self.fig1.add_subplot(111)
         self.ax2 = self.fig2.add_subplot(111)
         self.canvas1 = FigureCanvasTkAgg(self.fig1, self.window)
         self.canvas2 = FigureCanvasTkAgg(self.fig2, self.window)
-
+        self.canvas1.get_tk_widget().place(x=200, y=10)
+        self.canvas2.get_tk_widget().place(x=200, y=400)
 
     def select_file(self):
         self.filename = filedialog.askopenfilename(
@@ -108,54 +130,94 @@ class NanoindentationAnalysis:
             initialdir='/',
             filetypes=FILETYPES
         )
+        if not self.filename:
+            return
         self.load_file(self.filename)
-        self.selected_file_label.config(text=f"{self.filename.split('/')[-1]}")
 
     def load_file(self, selected_file_path):
-        self.data = file_manager.txt_to_df(selected_file_path)
+        self.submit_task('load', f"Loading {selected_file_path.split('/')[-1]}...",
+                         self.file_loaded, self.session.open, selected_file_path)
+
+    def file_loaded(self, opened):
+        files = len(self.session.files)
+        self.selected_file_label.config(text=opened.name if files == 1 else f"{opened.name} (+{files - 1})")
+        # lines of an earlier read of the same file may be stale
+        for entry in [entry for entry in self.curve_lines if entry[0] == opened.key]:
+            self.curve_lines.pop(entry).remove()
         self.list_up_box()
 
+    def submit_task(self, kind, message, on_done, function, *args):
+        """run function(*args) on the worker pool and pass its result to on_done on the Tk thread,
+        a newer task of the same kind cancels this one"""
+        self.cancel_task(kind)
+        generation = self.task_generations[kind]
+        future = self.executor.submit(function, *args)
+        self.pending_tasks[kind] = future
+        self.status_label.config(text=message)
+        self.window.after(POLL_INTERVAL, self.poll_task, kind, generation, future, on_done)
+
+    def cancel_task(self, kind):
+        self.task_generations[kind] = self.task_generations.get(kind, 0) + 1
+        future = self.pending_tasks.pop(kind, None)
+        if future is not None:
+            future.cancel()  # only stops tasks that haven't started, running ones are ignored when done
+
+    def poll_task(self, kind, generation, future, on_done):
+        if self.task_generations.get(kind) != generation:
+            return  # superseded by a newer task
+        if not future.done():
+            self.window.after(POLL_INTERVAL, self.poll_task, kind, generation, future, on_done)
+            return
+
+        del self.pending_tasks[kind]
+        try:
+            result = future.result()
+        except Exception as error:
+            self.status_label.config(text=f"{kind} failed: {error}")
+            return
+        if not self.pending_tasks:
+            self.status_label.config(text="")
+        on_done(result)
+
     def list_up_box(self):
-        curves_name = file_manager.return_curves_name_array(self.data)
-        for i in range(len(curves_name)):
-            self.list_box_1.insert(i, curves_name[i])
+        """list every curve of the session once, keeping the current selection"""
+        selected = set(self.listed_entries[i] for i in self.list_box_1.curselection())
+        self.listed_entries = self.session.entries()
+        self.list_box_1.delete(0, END)
+        for i, entry in enumerate(self.listed_entries):
+            self.list_box_1.insert(i, self.session.label(entry))
+            if entry in selected:
+                self.list_box_1.selection_set(i)
 
     def update_button1(self):
-        # initializing
-        self.fig1.clear()
-        self.ax1.clear()
-        self.create_figure()
-
-        # updating
+        if not self.session.files:
+            return
         self.return_selected_item()
         self.curves_selection()
-        self.plot_setting()
         self.top_plot_update()
 
     def update_button2(self):
-        # initializing
-        self.fig2.clear()
-        self.ax2.clear()
-        self.create_figure()
-
-        # updating
         self.combined_averaged_curves_plot()
-        self.plot_setting()
         self.botton_plot_update()
 
 
     def return_selected_item(self):
         self.selected_list_preview = []
         for i in self.list_box_1.curselection():
-            self.selected_list_preview.append(self.list_box_1.get(i))
+            self.selected_list_preview.append(self.listed_entries[i])
 
     def curves_selection(self):
+        """show the selected curves and hide the others, lines are created once per curve"""
         for i in range(len(self.selected_list_preview)):
-            x_name = f"X_{self.selected_list_preview[i]}_Pd_[nm]"
-            y_name = f"Y_{self.selected_list_preview[i]}_Hardness (H)_[MPa]"
-            x = self.data[x_name]
-            y = self.data[y_name]
-            self.ax1.plot(x, y, label=f'{self.selected_list_preview[i]}')
+            if self.selected_list_preview[i] not in self.curve_lines:
+                x = self.session.curve_values(self.selected_list_preview[i], 'Pd', 'X')
+                y = self.session.curve_values(self.selected_list_preview[i], 'Hardness (H)', 'Y')
+                line = downsampling.LODLine(self.ax1, x, y, label=self.session.label(self.selected_list_preview[i]))
+                self.curve_lines[self.selected_list_preview[i]] = line
+
+        for name, line in self.curve_lines.items():
+            line.set_visible(name in self.selected_list_preview)
+        self.set_merged_visible(False)
 
     def plot_setting(self):
         self.ax1.set_xlabel('Pd [nm]')
@@ -165,34 +227,58 @@ class NanoindentationAnalysis:
         self.ax2.set_ylim([0, 1900])
 
     def top_plot_update(self):
-        self.canvas1 = FigureCanvasTkAgg(self.fig1, self.window)
-        self.canvas1.get_tk_widget().place(x=200, y=10)
+        self.rescale(self.ax1)
+        self.canvas1.draw_idle()
 
     def botton_plot_update(self):
-        self.canvas2 = FigureCanvasTkAgg(self.fig2, self.window)
-        self.canvas2.get_tk_widget().place(x=200, y=400)
+        self.rescale(self.ax2)
+        self.canvas2.draw_idle()
 
-    def merging_curve_button(self):
-        # initializing
-        self.fig1.clear()
-        self.ax1.clear()
-        self.create_figure()
+    def rescale(self, ax):
+        ax.relim(visible_only=True)
+        ax.autoscale_view(scalex=True, scaley=False)
 
+    def merging_curve_button(self):
+        if not self.session.files:
+            return
         self.curves_merging()
-        self.plot_setting()
-        self.top_plot_update()
 
     def curves_merging(self):
-        df = analyzer.averaged_curve(self.data, self.selected_list_preview)
+        entries = list(self.selected_list_preview)
+        merged = self.session.cached(entries, analyzer.WINDOW_SIZE, self.merge_mode.get())
+        if merged is not None:
+            self.cancel_task('merge')
+            self.curves_merged(merged)
+            return
+        self.submit_task('merge', f"Merging {len(entries)} curves...", self.curves_merged,
+                         self.session.merged, entries, analyzer.WINDOW_SIZE, self.merge_mode.get())
+
+    def curves_merged(self, df):
         self.current_merged_curve = df
 
-        self.ax1.plot(df['x'], df['mean'])
-        self.ax1.fill_between(df['x'], df['mean'] - df['std'], df['mean'] + df['std'], alpha=0.2)
-        # plt.xlabel('Pd (Nm)')
-        # plt.ylabel('Hardness (MPa)')
-        # plt.xlim([0, 1900])
-        # plt.ylim([-50, 1500])
-        # plt.show()
+        for line in self.curve_lines.values():
+            line.set_visible(False)
+        self.merged_artists = self.update_band(self.ax1, self.merged_artists, df)
+        self.top_plot_update()
+
+    def set_merged_visible(self, visible):
+        if self.merged_artists is not None:
+            for artist in self.merged_artists:
+                artist.set_visible(visible)
+
+    def update_band(self, ax, artists, df):
+        """draw mean and +-std band of df, reusing the line of artists and replacing only its band"""
+        df = df.iloc[downsampling.downsample_indices(df['x'], df['mean'])]
+        if artists is None:
+            line, = ax.plot(df['x'], df['mean'])
+        else:
+            line, fill = artists
+            fill.remove()
+            line.set_data(df['x'], df['mean'])
+            line.set_visible(True)
+        fill = ax.fill_between(df['x'], df['mean'] - df['std'], df['mean'] + df['std'],
+                               color=line.get_color(), alpha=0.2)
+        return line, fill
 
     def add1_btn_clicked(self):
         self.merged_to_dict(self.entry_strain_rate1)
@@ -212,14 +298,18 @@ class NanoindentationAnalysis:
 
     def combined_averaged_curves_plot(self):
         for strain_rate, dataframe in self.combined_plot_dict.items():
-            self.ax2.plot(dataframe['x'], dataframe['mean'])
-            self.ax2.fill_between(dataframe['x'], dataframe['mean'] - dataframe['std'],
-                                  dataframe['mean'] + dataframe['std'], alpha=0.2)
+            if self.combined_plotted.get(strain_rate) is dataframe:
+                continue  # unchanged since the last update
+            self.combined_artists[strain_rate] = self.update_band(self.ax2, self.combined_artists.get(strain_rate),
+                                                                  dataframe)
+            self.combined_plotted[strain_rate] = dataframe
 
 
 def main():
     nanoindentation_analysis = NanoindentationAnalysis()
     nanoindentation_analysis.window.mainloop()
+    nanoindentation_analysis.executor.shutdown(wait=False, cancel_futures=True)
 
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# the active Profiler, None while profiling is off so span() costs a single check
+_profiler = None
+_NULL_SPAN = nullcontext()
+
+
+class Span:
+    __slots__ = ('name', 'path', 'start', 'duration', 'peak_memory', 'args')
+
+    def __init__(self, name, path, start, args):
+        self.name = name
+        self.path = path
+        self.start = start
+        self.duration = 0.0
+        self.peak_memory = 0
+        self.args = args
+
+
+class Profiler:
+    """records nested spans with wall time, call counts, fit iterations and peak traced memory.
+    save() writes a Chrome trace (chrome://tracing, Perfetto or speedscope show it as a flame chart)
+    and summary() folds the spans into a flame-style text tree"""
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.spans = []
+        self._stack = []
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name, args=None):
+        path = (self._stack[-1].path if self._stack else ()) + (name,)
+        record = Span(name, path, time.perf_counter() - self._origin, dict(args or {}))
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1].peak_memory = max(self._stack[-1].peak_memory, peak)
+            tracemalloc.reset_peak()
+            record.peak_memory = current
+        self._stack.append(record)
+        try:
+            yield record
+        finally:
+            self._stack.pop()
+            record.duration = time.perf_counter() - self._origin - record.start
+            if self.memory:
+                record.peak_memory = max(record.peak_memory, tracemalloc.get_traced_memory()[1])
+                if self._stack:
+                    self._stack[-1].peak_memory = max(self._stack[-1].peak_memory, record.peak_memory)
+                tracemalloc.reset_peak()
+            self.spans.append(record)
+
+    def add_span(self, name, start, duration, args=None):
+        """record a span measured elsewhere as a child of the open span"""
+        path = (self._stack[-1].path if self._stack else ()) + (name,)
+        record = Span(name, path, start, dict(args or {}))
+        record.duration = duration
+        self.spans.append(record)
+
+    def totals(self):
+        """{path: {'time', 'calls', 'peak_memory', 'nfev'}} with the spans of the same path added up"""
+        totals = {}
+        for record in sorted(self.spans, key=lambda record: record.start):
+            total = totals.setdefault(record.path, {'time': 0.0, 'calls': 0, 'peak_memory': 0, 'nfev': 0})
+            total['time'] += record.duration
+            total['calls'] += 1
+            total['peak_memory'] = max(total['peak_memory'], record.peak_memory)
+            total['nfev'] += record.args.get('nfev', 0)
+        return totals
+
+    def summary(self):
+        totals = self.totals()
+        root_time = sum(total['time'] for path, total in totals.items() if len(path) == 1) or 1.0
+        lines = [f"{'span':40s} {'time (ms)':>11s} {'%':>6s} {'calls':>6s} {'nfev':>7s} {'peak (MB)':>10s}"]
+        first_start = {}
+        for record in sorted(self.spans, key=lambda record: record.start):
+            first_start.setdefault(record.path, record.start)
+        # a child sorts after its parent, siblings by when they first ran
+        for path in sorted(totals, key=lambda path: [first_start[path[:i + 1]] for i in range(len(path))]):
+            total = totals[path]
+            share = total['time'] / root_time
+            label = '  ' * (len(path) - 1) + path[-1]
+            # spans added from fit_info have no memory record
+            peak = f"{total['peak_memory'] / 1024 ** 2:10.1f}" if total['peak_memory'] else f"{'-':>10s}"
+            nfev = f"{total['nfev']:7d}" if total['nfev'] else f"{'':7s}"
+            lines.append(f"{label:40s} {total['time'] * 1e3:11.2f} {share * 100:6.1f} {total['calls']:6d} {nfev} "
+                         f"{peak} {'#' * round(share * 20)}")
+        return '\n'.join(lines)
+
+    def trace_events(self):
+        return [{'name': record.name, 'cat': '/'.join(record.path[:-1]) or 'root', 'ph': 'X', 'pid': os.getpid(),
+                 'tid': 0, 'ts': record.start * 1e6, 'dur': record.duration * 1e6,
+                 'args': {**record.args, 'peak_memory': record.peak_memory}}
+                for record in sorted(self.spans, key=lambda record: record.start)]
+
+    def save(self, file_path):
+        """write the spans as a Chrome trace json file"""
+        with open(file_path, 'w') as file:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms',
+                       'otherData': {'memory': self.memory}}, file)
+
+
+@contextmanager
+def profile(file_path=None, memory=True):
+    """turn profiling on for the block and yield the Profiler, the trace is saved to file_path when given.
+    memory traces allocations with tracemalloc, which slows python code down noticeably"""
+    global _profiler
+    if _profiler is not None:
+        raise RuntimeError("profiling is already on")
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _profiler = Profiler(memory)
+    try:
+        yield _profiler
+    finally:
+        profiler, _profiler = _profiler, None
+        if started_tracing:
+            tracemalloc.stop()
+        if file_path is not None:
+            profiler.save(file_path)
+
+
+def span(name, **args):
+    """context manager timing a block while profiling is on, a shared no-op otherwise"""
+    if _profiler is None:
+        return _NULL_SPAN
+    return _profiler.span(name, args)
+
+
+def record_fits(data_manager):
+    """add one 'fit' span per fitted case to the open span, laid out one after another from fit_info"""
+    if _profiler is None:
+        return
+    parent = _profiler._stack[-1] if _profiler._stack else None
+    start = parent.start if parent is not None else time.perf_counter() - _profiler._origin
+    for case in data_manager.values():
+        if case.fit_info is None:
+            continue
+        _profiler.add_span('fit', start, case.fit_info['fit_time'],
+                           {'case': case.name, 'nfev': case.fit_info['nfev'], 'njev': case.fit_info['njev'],
+                            'attempts': case.fit_info['attempts'], 'start': case.fit_info['start']})
+        start += case.fit_info['fit_time']
@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import analyzer
+import file_manager
+
+MERGE_CACHE_SIZE = 64  # merged curves kept per session, least recently used go first
+
+# key is the absolute path, stamp the size and modification time the file was read at
+SessionFile = namedtuple('SessionFile', ['key', 'path', 'name', 'curves', 'stamp'])
+
+
+class Session:
+    """exports opened side by side, each kept as file_manager.CurveColumns over the memory-mapped
+    columns of data_cache. curves are indexed once as (file key, curve) entries and merged curves are
+    cached by (entries, window size, mode). open and merged may run on worker threads"""
+
+    def __init__(self, merge_cache_size=MERGE_CACHE_SIZE):
+        self.files = {}  # key -> SessionFile in opening order
+        self.merge_cache_size = merge_cache_size
+        self._merged = OrderedDict()  # (entries, window_size, mode) -> merged DataFrame
+        self._lock = threading.Lock()
+
+    def open(self, file_path):
+        """read an export into the session and return its SessionFile, a file that is already open and
+        unchanged is returned without reading it again"""
+        key = os.path.abspath(file_path)
+        stamp = _file_stamp(key)
+        with self._lock:
+            opened = self.files.get(key)
+        if opened is not None and opened.stamp == stamp:
+            return opened
+
+        data = file_manager.txt_to_df(file_path)
+        schema = file_manager.ExportSchema(data)
+        # columns of a cached export are views of its .npy files, nothing is copied
+        columns = {column: data.iloc[:, position].to_numpy(dtype=float)
+                   for column, position in schema.curve_columns().items()}
+        opened = SessionFile(key, file_path, os.path.basename(file_path), file_manager.CurveColumns(columns), stamp)
+        with self._lock:
+            self.files[key] = opened
+            self._drop_merged(key)
+        return opened
+
+    def close(self, file_path):
+        key = os.path.abspath(file_path)
+        with self._lock:
+            self.files.pop(key, None)
+            self._drop_merged(key)
+
+    def entries(self):
+        """(file key, curve) of every curve of every open file, each once, in opening and column order"""
+        with self._lock:
+            return [(key, curve) for key, opened in self.files.items() for curve in opened.curves.curve_names]
+
+    def label(self, entry):
+        """curve name, prefixed with the file name once several files are open"""
+        key, curve = entry
+        if len(self.files) == 1:
+            return curve
+        return f"{self.files[key].name}: {curve}"
+
+    def curve_values(self, entry, quantity, axis=None):
+        key, curve = entry
+        return self.files[key].curves.curve_values(curve, quantity, axis)
+
+    def merged(self, entries, window_size=analyzer.WINDOW_SIZE, mode='rolling'):
+        """merged x/mean/std curve of the entries (see analyzer.averaged_arrays), computed once per
+        curve set, window size and mode. entries may come from different files"""
+        cache_key = (self._canonical(entries), window_size, mode)
+        merged = self.cached(*cache_key)
+        if merged is not None:
+            return merged
+
+        entries = cache_key[0]
+        with self._lock:
+            sources = {key: self.files[key] for key, _ in entries}
+        merged = analyzer.averaged_arrays([self.curve_values(entry, 'Pd', 'X') for entry in entries],
+                                          [self.curve_values(entry, 'Hardness (H)', 'Y') for entry in entries],
+                                          window_size, mode=mode)
+        with self._lock:
+            # a file reopened while merging makes the result stale
+            if all(self.files.get(key) is source for key, source in sources.items()):
+                self._merged[cache_key] = merged
+                while len(self._merged) > self.merge_cache_size:
+                    self._merged.popitem(last=False)
+        return merged
+
+    def cached(self, entries, window_size=analyzer.WINDOW_SIZE, mode='rolling'):
+        """the cached merged curve of the entries, None when it wasn't merged yet"""
+        cache_key = (self._canonical(entries), window_size, mode)
+        with self._lock:
+            merged = self._merged.get(cache_key)
+            if merged is not None:
+                self._merged.move_to_end(cache_key)
+        return merged
+
+    def _canonical(self, entries):
+        """entries without duplicates in index order, so the same curve set always merges the same way"""
+        with self._lock:
+            order = {key: i for i, key in enumerate(self.files)}
+            return tuple(sorted(set(entries), key=lambda entry: (
+                order[entry[0]], self.files[entry[0]].curves.curve_names.index(entry[1]))))
+
+    def _drop_merged(self, key):
+        for cache_key in [cache_key for cache_key in self._merged if any(k == key for k, _ in cache_key[0])]:
+            del self._merged[cache_key]
+
+
+def _file_stamp(file_path):
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
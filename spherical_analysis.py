@@ -0,0 +1,246 @@
+import argparse
+import sys
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import creep_analysis
+import file_manager
+
+WORKBOOK_FILE_PATH = './example_file/Spherical_H_100mN.xlsx'
+CURVE_SHEET = 'raw data'
+REPORT_SHEET = 'data'
+
+ZERO_POINT_LOAD_FRACTION = 0.05  # initial loading up to this fraction of the max load is fitted with hertz
+ZERO_POINT_CANDIDATES = 32  # zero points tried per test in every refinement
+ZERO_POINT_REFINEMENTS = 4
+LOADING_END_FRACTION = 0.99  # loading ends where the load first reaches this fraction of the max load
+CONTACT_ITERATIONS = 50
+CONTACT_TOLERANCE = 1e-6  # relative change of the contact radius at which the iteration stops
+
+SphericalResult = namedtuple('SphericalResult', ['table', 'tests'])
+
+TABLE_COLUMNS = ['test', 'time', 'depth', 'load', 'contact_radius', 'stress', 'strain']
+TEST_COLUMNS = ['test', 'radius', 'modulus', 'zero_depth', 'zero_load', 'zero_point_rmse', 'loading_points',
+                'peak_stress', 'hit']
+
+
+def read_workbook(file_path, curve_sheet=CURVE_SHEET, report_sheet=REPORT_SHEET, chunksize=file_manager.CHUNK_SIZE):
+    """curves of the raw data sheet, O&P report (or None) and the per test constants (Er, S and R of the sheets
+    named after the test numbers) of a spherical workbook, every sheet is streamed"""
+    curves = file_manager.read_xlsx_curves(file_path, curve_sheet, chunksize=chunksize)
+    try:
+        report = file_manager.ParameterTable(file_manager.read_xlsx_report(file_path, report_sheet))
+    except KeyError:
+        report = None
+    return curves, report, read_test_constants(file_path)
+
+
+def read_test_constants(file_path, names=('Er', 'S', 'R')):
+    """first value below the Er, S and R headers of every sheet named after a test number, indexed by test.
+    the workbook is opened once and only the first two rows of each sheet are parsed"""
+    constants = {}
+    with pd.ExcelFile(file_path) as workbook:
+        for sheet in workbook.sheet_names:
+            if not sheet.strip().isdigit():
+                continue
+            rows = workbook.parse(sheet, header=None, nrows=2)
+            if len(rows) < 2:
+                continue
+            header = [str(label).strip() if pd.notna(label) else None for label in rows.iloc[0]]
+            constants[int(sheet)] = {name: rows.iloc[1, header.index(name)] if name in header else np.nan
+                                     for name in names}
+    return pd.DataFrame.from_dict(constants, orient='index', columns=list(names), dtype=float).rename_axis('test')
+
+
+def stack_tests(curves, tests=None):
+    """NaN padded (tests, samples) time, load and depth arrays of the curves, curves without a load are skipped"""
+    if tests is None:
+        tests = curves.curve_names
+    tests = [test for test in tests if _has_curve(curves, test)]
+    time, _ = creep_analysis.stack_segments([curves.curve_values(test, 'Time', 'X') for test in tests])
+    load, _ = creep_analysis.stack_segments([curves.curve_values(test, 'Fn', 'Y') for test in tests])
+    depth, _ = creep_analysis.stack_segments([curves.curve_values(test, 'Pd', 'Y') for test in tests])
+    return tests, time, load, depth
+
+
+def loading_end(load, fraction=LOADING_END_FRACTION):
+    """index of the first point of every test where the load reaches fraction of its maximum"""
+    peak = np.nanmax(load, axis=1, initial=0.0, where=np.isfinite(load))
+    return np.argmax(load >= fraction * peak[:, None], axis=1)
+
+
+def effective_zero_point(depth, load, end, radius, load_fraction=ZERO_POINT_LOAD_FRACTION,
+                         candidates=ZERO_POINT_CANDIDATES, refinements=ZERO_POINT_REFINEMENTS):
+    """effective zero point (depth h*, load P*) of every test from the hertz fit
+    load = P* + 4/3 E sqrt(R) (depth - h*)^1.5 of the loading up to load_fraction of the end load.
+    the approach before contact is fitted as the line load = P* + b (depth - h*) so it doesn't pull P* down.
+    for every candidate h* the fit is linear in P*, E and b, so all candidates of all tests are solved at
+    once from sums and the grid around the best candidate is refined. returns h*, P*, E (GPa) and the rms
+    residual. depth in nm, load in mN, radius in nm"""
+    radius = np.broadcast_to(np.asarray(radius, dtype=float), (len(depth),))
+    samples = np.arange(depth.shape[1])
+    end_load = load[np.arange(len(load)), end]
+    fitted = (samples <= end[:, None]) & (load <= load_fraction * end_load[:, None]) \
+        & np.isfinite(depth) & np.isfinite(load)
+    width = np.flatnonzero(fitted.any(axis=0)).max(initial=-1) + 1  # the initial loading, not the whole curve
+    fitted, depth, load = fitted[:, :width], depth[:, :width], load[:, :width]
+    count = fitted.sum(axis=1)
+    h = np.where(fitted, depth, np.nan)
+    p = np.where(fitted, load, 0.0)[:, None, :]
+
+    low = np.nanmin(h, axis=1, initial=np.inf, where=fitted)
+    high = np.nanmax(h, axis=1, initial=-np.inf, where=fitted)
+    low = low - (high - low)  # the zero point lies below the first points, or among them after an approach
+    for _ in range(refinements):
+        zero = np.linspace(low, high, candidates, axis=1)  # (tests, candidates)
+        offset = np.where(fitted[:, None, :], depth[:, None, :] - zero[:, :, None], 0.0)
+        u = np.maximum(offset, 0.0) ** 1.5  # hertz contact
+        v = np.minimum(offset, 0.0)  # approach
+        regressors = (np.broadcast_to(fitted[:, None, :], u.shape).astype(float), u, v)
+        # normal equations of P*, 4/3 E sqrt(R) and b for every (test, candidate)
+        normal = np.stack([np.stack([(a * b).sum(axis=2) for b in regressors], axis=-1) for a in regressors],
+                          axis=-2)
+        moments = np.stack([(a * p).sum(axis=2) for a in regressors], axis=-1)
+        coefficients = (np.linalg.pinv(normal) @ moments[..., None])[..., 0]
+        residual = (p * p).sum(axis=2) - (coefficients * moments).sum(axis=-1)
+        intercept, slope = coefficients[..., 0], coefficients[..., 1]
+        residual = np.where(np.isfinite(residual) & (slope > 0), residual, np.inf)
+        best = np.argmin(residual, axis=1)
+        step = (high - low) / (candidates - 1)
+        rows = np.arange(len(depth))
+        zero_depth, zero_load, fit_slope = zero[rows, best], intercept[rows, best], slope[rows, best]
+        rmse = np.sqrt(np.maximum(residual[rows, best], 0.0) / np.maximum(count, 1))
+        low, high = zero_depth - step, zero_depth + step
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        modulus = 3 * fit_slope / (4 * np.sqrt(radius)) * 1e6  # mN/nm^2 -> GPa
+    invalid = count < 3
+    for values in (zero_depth, zero_load, modulus, rmse):
+        values[invalid] = np.nan
+    return zero_depth, zero_load, modulus, rmse
+
+
+def contact_radius(depth, load, radius, modulus, stiffness=None, epsilon=creep_analysis.EPSILON,
+                   iterations=CONTACT_ITERATIONS, tolerance=CONTACT_TOLERANCE):
+    """contact radius (nm) of every point of (tests, samples) zero point corrected depth (nm) and load (mN).
+    with the continuous stiffness (mN/nm) a = S / (2 E). without it the elastic unloading stiffness of the
+    spherical contact S = 2 a E is used in hc = h - epsilon P / S and a = sqrt(2 R hc - hc^2), solved by
+    fixed point iteration for all points at once. modulus is the effective modulus in GPa per test"""
+    modulus = np.asarray(modulus, dtype=float).reshape(-1, 1) * 1e-6  # GPa -> mN/nm^2
+    if stiffness is not None:
+        return np.asarray(stiffness, dtype=float) / (2 * modulus)
+
+    radius = np.asarray(radius, dtype=float).reshape(-1, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        contact = np.sqrt(np.clip(2 * radius * depth - depth ** 2, 0.0, None))
+        for _ in range(iterations):
+            contact_depth = np.clip(depth - epsilon * load / (2 * contact * modulus), 0.0, radius)
+            updated = np.sqrt(2 * radius * contact_depth - contact_depth ** 2)
+            change = np.nanmax(np.abs(updated - contact) / updated, initial=0.0,
+                               where=np.isfinite(updated) & (updated > 0))
+            contact = updated
+            if change < tolerance:
+                break
+    return np.where(contact > 0, contact, np.nan)
+
+
+def indentation_stress_strain(depth, load, contact):
+    """indentation stress P / (pi a^2) in GPa and strain 4 h / (3 pi a) of zero point corrected depth (nm),
+    load (mN) and contact radius (nm)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stress = load / (np.pi * contact ** 2) * 1e6
+        strain = 4 * depth / (3 * np.pi * contact)
+    return stress, strain
+
+
+def stress_strain(curves, constants=None, tests=None, radius=creep_analysis.TIP_RADIUS, modulus=None,
+                  load_fraction=ZERO_POINT_LOAD_FRACTION, epsilon=creep_analysis.EPSILON):
+    """indentation stress-strain curve of the loading of every test as SphericalResult(table, tests):
+    table has one row per loading point after the zero point, tests the zero point, radius and modulus of
+    every test. the radius (um) is the R column of constants when a test has one, radius otherwise.
+    the effective modulus (GPa) is the hertz fit of the zero point with that radius unless modulus is given,
+    since the elastic loading only fixes E sqrt(R) a modulus from elsewhere (e.g. the O&P Er) needs the
+    matching effective radius"""
+    names, time, load, depth = stack_tests(curves, tests)
+    numbers = np.array([int(name.rsplit("_", 1)[1]) for name in names], dtype=int)
+    radii = _test_values(constants, 'R', numbers, radius) * 1e3  # um -> nm
+    end = loading_end(load)
+    zero_depth, zero_load, moduli, rmse = effective_zero_point(depth, load, end, radii, load_fraction)
+    if modulus is not None:
+        moduli = np.broadcast_to(np.asarray(modulus, dtype=float), moduli.shape).copy()
+
+    corrected_depth = depth - zero_depth[:, None]
+    corrected_load = load - zero_load[:, None]
+    loading = (np.arange(depth.shape[1]) <= end[:, None]) & (corrected_depth > 0) & (corrected_load > 0)
+    corrected_depth = np.where(loading, corrected_depth, np.nan)
+    corrected_load = np.where(loading, corrected_load, np.nan)
+    contact = contact_radius(corrected_depth, corrected_load, radii, moduli, epsilon=epsilon)
+    stress, strain = indentation_stress_strain(corrected_depth, corrected_load, contact)
+
+    rows, samples = np.nonzero(loading & np.isfinite(stress))
+    peak_stress = stress[np.arange(len(names)), end]
+    table = pd.DataFrame({'test': np.asarray(names, dtype=object)[rows], 'time': time[rows, samples],
+                          'depth': corrected_depth[rows, samples], 'load': corrected_load[rows, samples],
+                          'contact_radius': contact[rows, samples], 'stress': stress[rows, samples],
+                          'strain': strain[rows, samples]})
+    tests = pd.DataFrame({'test': names, 'radius': radii, 'modulus': moduli, 'zero_depth': zero_depth,
+                          'zero_load': zero_load, 'zero_point_rmse': rmse,
+                          'loading_points': np.bincount(rows, minlength=len(names)), 'peak_stress': peak_stress,
+                          'hit': _test_values(constants, 'HIT', numbers, np.nan)})
+    return SphericalResult(table[TABLE_COLUMNS], tests[TEST_COLUMNS])
+
+
+def analyze_workbook(file_path, tests=None, radius=creep_analysis.TIP_RADIUS, modulus=None,
+                     load_fraction=ZERO_POINT_LOAD_FRACTION, chunksize=file_manager.CHUNK_SIZE):
+    """stress_strain of every test of a spherical workbook, tests get the O&P hardness of the report as hit
+    to compare with the stress at the end of loading"""
+    curves, report, constants = read_workbook(file_path, chunksize=chunksize)
+    if report is not None and 'HIT (O&P)' in report.units:
+        hit = report.parameter('HIT').droplevel('Group')
+        constants = constants.reindex(constants.index.union(hit.index))
+        constants['HIT'] = hit
+    return stress_strain(curves, constants, tests, radius, modulus, load_fraction)
+
+
+def _has_curve(curves, test):
+    try:
+        curves.curve_values(test, 'Fn', 'Y')
+    except KeyError:
+        return False
+    return True
+
+
+def _test_values(constants, column, numbers, default):
+    """a constants column per test number, default where a test has no finite value"""
+    values = np.full(len(numbers), default, dtype=float)
+    if constants is not None and column in constants:
+        given = constants[column].reindex(numbers).to_numpy(dtype=float)
+        values = np.where(np.isfinite(given), given, values)
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indentation stress-strain curves of every test of a spherical "
+                                                 "indentation workbook.")
+    parser.add_argument('file', nargs='?', default=WORKBOOK_FILE_PATH, help="workbook (.xlsx)")
+    parser.add_argument('-o', '--output', default='spherical_stress_strain.csv', help="stress-strain table (.csv)")
+    parser.add_argument('--tests-output', default=None, help="also write the zero points to this .csv")
+    parser.add_argument('-r', '--radius', type=float, default=creep_analysis.TIP_RADIUS,
+                        help="tip radius in um for tests without an R")
+    parser.add_argument('--load-fraction', type=float, default=ZERO_POINT_LOAD_FRACTION,
+                        help="fraction of the max load fitted for the zero point")
+    args = parser.parse_args(argv)
+
+    result = analyze_workbook(args.file, radius=args.radius, load_fraction=args.load_fraction)
+    result.table.to_csv(args.output, index=False)
+    if args.tests_output is not None:
+        result.tests.to_csv(args.tests_output, index=False)
+    print(result.tests.to_string(index=False))
+    print(f"{len(result.table)} points of {len(result.tests)} tests -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
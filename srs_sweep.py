@@ -0,0 +1,116 @@
+import argparse
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import analyzer
+import file_manager
+
+DEFAULT_DEPTHS = np.arange(200, 1700, 50)
+
+SweepResult = namedtuple('SweepResult', ['table', 'curves'])
+
+TABLE_COLUMNS = ['material', 'grain', 'strain_rate', 'depth', 'hardness', 'hardness_std', 'n_repetitions',
+                 'm', 'm_stderr', 'r_squared', 'n_rates']
+
+
+def sweep(data, depths=DEFAULT_DEPTHS, grains=None, repetitions=None, window_size=analyzer.WINDOW_SIZE,
+          workers=None, schema=None, mode='rolling'):
+    """merge every (material, grain, strain rate) group of a srs export on a process pool and return
+    SweepResult(table, curves):
+    table has one row per group and depth with the merged hardness, its std, and m of the grain at that depth,
+    curves holds the merged x/mean/std curve of every group.
+    repetitions restricts the merge, e.g. (1, 2, 3) like the notebook, mode is one of analyzer.MERGE_MODES"""
+    if schema is None:
+        schema = file_manager.ExportSchema(data)
+    depths = np.atleast_1d(np.asarray(depths, dtype=float))
+    if grains is not None:
+        grains = {str(grain) for grain in grains}
+
+    tasks = []
+    for material, grain, strain_rate in schema.groups():
+        if strain_rate is None or (grains is not None and grain not in grains):
+            continue
+        curves = [curve for curve in schema.group_curves(material, grain, strain_rate)
+                  if repetitions is None or int(curve.split("_")[-1]) in repetitions]
+        if not curves:
+            continue
+        # only the group's arrays are sent to the worker, not the whole export
+        tasks.append(((material, grain, strain_rate),
+                      [schema.curve_values(curve, 'Pd', 'X') for curve in curves],
+                      [schema.curve_values(curve, 'Hardness (H)', 'Y') for curve in curves],
+                      depths, window_size, mode))
+
+    if workers == 1 or len(tasks) <= 1:
+        merged = list(map(merge_group, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            merged = list(executor.map(merge_group, tasks, chunksize=max(1, len(tasks) // 32)))
+
+    return SweepResult(_depth_table(merged, depths), _curve_table(merged))
+
+
+def merge_group(task):
+    """merge the repetitions of one group and sample the merged curve at every depth, runs on a worker"""
+    group, pd_arrays, hardness_arrays, depths, window_size, mode = task
+    merged_curve = analyzer.averaged_arrays(pd_arrays, hardness_arrays, window_size, mode=mode)
+    return (group, len(pd_arrays), merged_curve,
+            analyzer.hardness_at_depths(merged_curve, depths),
+            analyzer.hardness_at_depths(merged_curve, depths, 'std'))
+
+
+def _depth_table(merged, depths):
+    grain_rows = {}  # (material, grain) -> indices into merged
+    for i, ((material, grain, strain_rate), *_) in enumerate(merged):
+        grain_rows.setdefault((material, grain), []).append(i)
+
+    tables = []
+    for (material, grain), rows in grain_rows.items():
+        strain_rates = np.array([merged[i][0][2] for i in rows])
+        hardness = np.array([merged[i][3] for i in rows])
+        fit = analyzer.loglog_fit(strain_rates, hardness)
+        for j, i in enumerate(rows):
+            tables.append(pd.DataFrame({'material': material, 'grain': grain, 'strain_rate': strain_rates[j],
+                                        'depth': depths, 'hardness': hardness[j], 'hardness_std': merged[i][4],
+                                        'n_repetitions': merged[i][1], 'm': fit['m'], 'm_stderr': fit['m_stderr'],
+                                        'r_squared': fit['r_squared'], 'n_rates': fit['n_rates']}))
+
+    if not tables:
+        return pd.DataFrame(columns=TABLE_COLUMNS)
+    return pd.concat(tables, ignore_index=True)
+
+
+def _curve_table(merged):
+    curves = [merged_curve.assign(material=material, grain=grain, strain_rate=strain_rate)
+              for (material, grain, strain_rate), _, merged_curve, *_ in merged]
+    if not curves:
+        return pd.DataFrame(columns=['material', 'grain', 'strain_rate', 'x', 'mean', 'std'])
+    return pd.concat(curves, ignore_index=True)[['material', 'grain', 'strain_rate', 'x', 'mean', 'std']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge every grain and strain rate of a srs export and compute m.")
+    parser.add_argument('file', help="srs export, e.g. example_file/srs_mg.TXT")
+    parser.add_argument('-o', '--output', default='srs_sweep.csv', help="per depth table (.csv)")
+    parser.add_argument('--curves', default=None, help="also write the merged curves to this .csv")
+    parser.add_argument('--depths', type=float, nargs='+', default=None, help="depths in nm")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="number of worker processes")
+    parser.add_argument('-m', '--mode', default='rolling', choices=analyzer.MERGE_MODES, help="merge mode")
+    args = parser.parse_args(argv)
+
+    depths = DEFAULT_DEPTHS if args.depths is None else args.depths
+    result = sweep(file_manager.txt_to_df(args.file), depths, workers=args.jobs, mode=args.mode)
+    result.table.to_csv(args.output, index=False)
+    if args.curves is not None:
+        result.curves.to_csv(args.curves, index=False)
+
+    print(f"{result.table[['material', 'grain']].drop_duplicates().shape[0]} grains, "
+          f"{len(result.table)} rows -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
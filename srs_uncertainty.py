@@ -0,0 +1,212 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+import analyzer
+import creep_analysis
+import file_manager
+
+N_BOOTSTRAP = 2000
+CONFIDENCE = 0.95
+TAIL_BLOCKS = 20  # contiguous blocks the creep tail is cut into, blocks keep the autocorrelation of the tail
+METHODS = ('bootstrap', 'jackknife')
+
+CASE_COLUMNS = ['case', 'group', 'm', 'm_low', 'm_high', 'm_se', 'n', 'n_low', 'n_high', 'method']
+GROUP_COLUMNS = ['group', 'n_repetitions', 'm', 'm_low', 'm_high', 'm_se', 'n', 'n_low', 'n_high', 'method']
+SRS_COLUMNS = ['material', 'grain', 'depth', 'm', 'm_low', 'm_high', 'm_se', 'n', 'n_low', 'n_high', 'method']
+
+
+def case_intervals(data_manager, window=creep_analysis.SRS_FIT_WINDOW, method='bootstrap', n_boot=N_BOOTSTRAP,
+                   blocks=TAIL_BLOCKS, confidence=CONFIDENCE, seed=None):
+    """confidence interval of m and n = 1/m of every case fitted by srs_insert, as a DataFrame.
+    the creep tail srs_insert fits is cut into blocks which are resampled (bootstrap) or left out one at a time
+    (jackknife), every replicate fit of every case is solved at once from per block sums"""
+    cases, replicates, estimates = _case_replicates(data_manager, window, method, n_boot, blocks, seed)
+    m_low, m_high, m_se = _interval(estimates, replicates, method, confidence)
+    return _table(CASE_COLUMNS, estimates, m_low, m_high, m_se, method,
+                  case=[case.name for case in cases], group=[case.group for case in cases])
+
+
+def group_intervals(data_manager, window=creep_analysis.SRS_FIT_WINDOW, method='bootstrap', n_boot=N_BOOTSTRAP,
+                    blocks=TAIL_BLOCKS, confidence=CONFIDENCE, seed=None):
+    """confidence interval of the mean m of the repetitions of every group (e.g. one grain and load).
+    the bootstrap resamples the repetitions and, within each, its creep tail blocks. the jackknife leaves out
+    one repetition at a time"""
+    rng = np.random.default_rng(seed)
+    cases, replicates, estimates = _case_replicates(data_manager, window, method, n_boot, blocks, rng)
+
+    groups = {}
+    for i, case in enumerate(cases):
+        groups.setdefault(case.group, []).append(i)
+
+    names, sizes, group_estimates, group_replicates = [], [], [], []
+    for group, rows in groups.items():
+        rows = np.array(rows)
+        names.append(group)
+        sizes.append(len(rows))
+        group_estimates.append(estimates[rows].mean())
+        if method == 'bootstrap':
+            picks = rows[rng.integers(len(rows), size=(n_boot, len(rows)))]
+            group_replicates.append(np.take_along_axis(replicates, picks, axis=1).mean(axis=1))
+        else:
+            # means without one repetition each, padded with NaN to the largest group
+            leave_out = np.full(max(map(len, groups.values())), np.nan)
+            if len(rows) > 1:
+                leave_out[:len(rows)] = (estimates[rows].sum() - estimates[rows]) / (len(rows) - 1)
+            group_replicates.append(leave_out)
+
+    group_estimates = np.array(group_estimates)
+    group_replicates = np.column_stack(group_replicates) if names else np.empty((0, 0))
+    m_low, m_high, m_se = _interval(group_estimates, group_replicates, method, confidence)
+    return _table(GROUP_COLUMNS, group_estimates, m_low, m_high, m_se, method, group=names, n_repetitions=sizes)
+
+
+def srs_intervals(data, depths, grains=None, method='bootstrap', n_boot=N_BOOTSTRAP, confidence=CONFIDENCE,
+                  seed=None, schema=None):
+    """confidence interval of m(depth) of every (material, grain) of a srs export like analyzer.srs_profile.
+    the repetitions of every strain rate are interpolated at the depths once, replicates resample them
+    (bootstrap) or leave one out (jackknife) and the log-log fits of all replicates and depths are solved at once.
+    the merged hardness of a strain rate is the mean of its repetitions at each depth, as in the grid merge"""
+    if schema is None:
+        schema = file_manager.ExportSchema(data)
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}, expected one of {', '.join(METHODS)}")
+    rng = np.random.default_rng(seed)
+    depths = np.atleast_1d(np.asarray(depths, dtype=float))
+    if grains is not None:
+        grains = {str(grain) for grain in grains}
+
+    strain_rates = {}  # (material, grain) -> strain rates
+    for material, grain, strain_rate in schema.groups():
+        if strain_rate is None or (grains is not None and grain not in grains):
+            continue
+        strain_rates.setdefault((material, grain), []).append(strain_rate)
+
+    tables = []
+    for (material, grain), rates in strain_rates.items():
+        hardness = []  # per strain rate (repetitions, depths)
+        for rate in rates:
+            curves = schema.group_curves(material, grain, rate)
+            hardness.append(analyzer.repetitions_at_depths([schema.curve_values(curve, 'Pd', 'X') for curve in curves],
+                                                           [schema.curve_values(curve, 'Hardness (H)', 'Y')
+                                                            for curve in curves], depths))
+
+        merged = np.array([_weighted_mean(values, np.ones((1, len(values))))[0] for values in hardness])
+        estimates = analyzer.loglog_fit(rates, merged)['m']
+        if method == 'bootstrap':
+            means = np.array([_weighted_mean(values, _bootstrap_counts(rng, 1, n_boot, len(values))[0])
+                              for values in hardness])  # (rates, replicates, depths)
+        else:
+            # one replicate per repetition, in which only its strain rate loses it
+            blocks = []
+            for i, values in enumerate(hardness):
+                block = np.repeat(merged[:, None], len(values), axis=1)
+                block[i] = _weighted_mean(values, 1 - np.eye(len(values)))
+                blocks.append(block)
+            means = np.concatenate(blocks, axis=1)
+        replicates = analyzer.loglog_fit(rates, means.reshape(len(rates), -1))['m'].reshape(means.shape[1:])
+
+        m_low, m_high, m_se = _interval(estimates, replicates, method, confidence)
+        tables.append(_table(SRS_COLUMNS, estimates, m_low, m_high, m_se, method,
+                             material=material, grain=grain, depth=depths))
+
+    if not tables:
+        return pd.DataFrame(columns=SRS_COLUMNS)
+    return pd.concat(tables, ignore_index=True)
+
+
+def batched_slopes(sums):
+    """slope and intercept of the least squares lines of any number of fits at once from their sums
+    (..., 5) = count, sum x, sum y, sum x^2, sum x*y"""
+    count, x, y, xx, xy = np.moveaxis(sums, -1, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (count * xy - x * y) / (count * xx - x * x)
+        intercept = (y - slope * x) / count
+    return slope, intercept
+
+
+def block_sums(x, y, blocks=TAIL_BLOCKS):
+    """(blocks, 5) sums of batched_slopes over contiguous blocks of the finite points of x and y"""
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    sums = np.zeros((blocks, 5))
+    if len(x) < blocks:
+        return sums
+    starts = np.linspace(0, len(x), blocks + 1).astype(int)[:-1]
+    for k, values in enumerate((np.ones_like(x), x, y, x * x, x * y)):
+        sums[:, k] = np.add.reduceat(values, starts)
+    return sums
+
+
+def _case_replicates(data_manager, window, method, n_boot, blocks, seed):
+    """fitted cases, (replicates, cases) slopes and the slopes of the full tails"""
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}, expected one of {', '.join(METHODS)}")
+    rng = np.random.default_rng(seed)
+    cases = [case for case in data_manager.ok_cases() if np.isfinite(case.srs_m)]
+
+    sums = np.zeros((len(cases), blocks, 5))
+    for i, case in enumerate(cases):
+        # the points fit_srs uses, centred so the sums stay small
+        x = case.log_strain_rate[-window:-1]
+        y = case.log_hardness[-window:-1]
+        sums[i] = block_sums(x - np.nanmean(x), y - np.nanmean(y), blocks)
+
+    estimates, _ = batched_slopes(sums.sum(axis=1))
+    if method == 'bootstrap':
+        # (cases, replicates, blocks) @ (cases, blocks, 5)
+        replicates, _ = batched_slopes(_bootstrap_counts(rng, len(cases), n_boot, blocks) @ sums)
+        replicates = replicates.T
+    else:
+        replicates, _ = batched_slopes(sums.sum(axis=1)[None] - np.moveaxis(sums, 1, 0))
+    return cases, replicates, estimates
+
+
+def _bootstrap_counts(rng, batches, n_boot, size):
+    """(batches, n_boot, size) float counts of how often every item is drawn when drawing size items with
+    replacement, the draws of all batches are counted by one bincount"""
+    draws = rng.integers(size, size=(batches * n_boot, size))
+    draws += np.arange(batches * n_boot)[:, None] * size
+    return np.bincount(draws.ravel(), minlength=batches * n_boot * size).reshape(batches, n_boot, size) \
+        .astype(float)
+
+
+def _weighted_mean(values, weights):
+    """(replicates, depths) means of (repetitions, depths) values with (replicates, repetitions) weights,
+    NaN values are left out"""
+    finite = np.isfinite(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (weights @ np.where(finite, values, 0.0)) / (weights @ finite)
+
+
+def _interval(estimates, replicates, method, confidence):
+    """percentile interval of bootstrap replicates, or estimate -+ z * jackknife standard error"""
+    with np.errstate(invalid='ignore'):
+        if method == 'bootstrap':
+            tail = (1 - confidence) / 2 * 100
+            finite = np.isfinite(replicates).any(axis=0)
+            low = np.full(estimates.shape, np.nan)
+            high = np.full(estimates.shape, np.nan)
+            if finite.any():
+                low[finite], high[finite] = np.nanpercentile(replicates[:, finite], [tail, 100 - tail], axis=0)
+            se = np.nanstd(replicates, axis=0, ddof=1) if len(replicates) > 1 else np.full(estimates.shape, np.nan)
+        else:
+            count = np.isfinite(replicates).sum(axis=0)
+            mean = np.nanmean(replicates, axis=0) if len(replicates) else np.full(estimates.shape, np.nan)
+            se = np.sqrt((count - 1) / count * np.nansum((replicates - mean) ** 2, axis=0))
+            se = np.where(count > 1, se, np.nan)
+            z = NormalDist().inv_cdf(0.5 + confidence / 2)
+            low, high = estimates - z * se, estimates + z * se
+    return low, high, se
+
+
+def _table(columns, m, m_low, m_high, m_se, method, **labels):
+    """DataFrame of the m intervals, n = 1/m with the interval of 1/m when the m interval excludes 0"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        positive = (m_low > 0) | (m_high < 0)
+        n_low = np.where(positive, 1 / m_high, np.nan)
+        n_high = np.where(positive, 1 / m_low, np.nan)
+        table = pd.DataFrame({**labels, 'm': m, 'm_low': m_low, 'm_high': m_high, 'm_se': m_se, 'n': 1 / m,
+                              'n_low': n_low, 'n_high': n_high, 'method': method})
+    return table[columns]
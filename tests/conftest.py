@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+import data_cache
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'example_file')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def session_cache_dir(tmp_path_factory):
+    """keep the column cache of module and session fixtures out of the real ~/.cache"""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(data_cache, 'CACHE_DIR', str(tmp_path_factory.mktemp('cache')))
+        yield
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """an empty column cache directory for every test"""
+    monkeypatch.setattr(data_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+
+@pytest.fixture(scope='session')
+def example_file():
+    return lambda name: os.path.join(EXAMPLE_DIR, name)
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import analyzer
+import file_manager
+
+# the window of the srs_mg_gd merge whose mean sits on a rounding boundary (see rolling_statistics)
+SRS_MG_GD_BOUNDARY_WINDOW = 8821
+
+
+def loop_rolling_statistics(x, y, window_size=analyzer.WINDOW_SIZE, rounding=True):
+    """the per window loop rolling_statistics replaced"""
+    x = pd.Series(x)
+    y = pd.Series(y)
+    moving_avgX, moving_avgY, moving_stdY = [], [], []
+    for i in range(len(x) - window_size + 1):
+        window_avg = np.sum(y[i:i + window_size]) / window_size
+        window_std = np.std(y[i:i + window_size])
+        moving_avgY.append(round(window_avg, 2) if rounding else window_avg)
+        moving_stdY.append(round(window_std) if rounding else window_std)
+        moving_avgX.append(x[i] + window_size / 2)
+    return pd.DataFrame({'x': moving_avgX, 'mean': moving_avgY, 'std': moving_stdY})
+
+
+def loop_averaged_curve(data, selected_curves, window_size=analyzer.WINDOW_SIZE):
+    """the averaged_curve before the cumulative sums: concat, DataFrame.sort_values and the window loop"""
+    merged = pd.DataFrame()
+    merged['Pd'] = pd.concat([data[f"X_{curve}_Pd_[nm]"] for curve in selected_curves])
+    merged['Hardness'] = pd.concat([data[f"Y_{curve}_Hardness (H)_[MPa]"] for curve in selected_curves])
+    merged.sort_values(by=['Pd'], axis=0, inplace=True)
+    merged.reset_index(drop=True, inplace=True)
+    return loop_rolling_statistics(merged['Pd'], merged['Hardness'], window_size)
+
+
+@pytest.fixture(scope='module')
+def srs_mg(example_file):
+    return file_manager.txt_to_df(example_file('srs_mg.TXT'))
+
+
+@pytest.fixture(scope='module')
+def srs_mg_merge(srs_mg):
+    """depth and hardness of every curve of srs_mg.TXT, sorted by depth"""
+    schema = file_manager.ExportSchema(srs_mg)
+    x = np.concatenate([schema.curve_values(curve, 'Pd', 'X') for curve in schema.curve_names])
+    y = np.concatenate([schema.curve_values(curve, 'Hardness (H)', 'Y') for curve in schema.curve_names])
+    order = np.argsort(x, kind='stable')
+    return x[order], y[order]
+
+
+def test_rolling_statistics_matches_window_loop(srs_mg_merge):
+    x, y = srs_mg_merge
+    expected = loop_rolling_statistics(x, y, rounding=False)
+    result = analyzer.rolling_statistics(x, y, rounding=False)
+    np.testing.assert_array_equal(result['x'], expected['x'])
+    # cumulative sums drift from the per window sums in the last bits
+    np.testing.assert_allclose(result['mean'], expected['mean'], rtol=0, atol=1e-6)
+    np.testing.assert_allclose(result['std'], expected['std'], rtol=0, atol=1e-3)
+
+
+def test_rounded_rolling_statistics_equal_window_loop(srs_mg_merge):
+    x, y = srs_mg_merge
+    pd.testing.assert_frame_equal(analyzer.rolling_statistics(x, y), loop_rolling_statistics(x, y))
+
+
+def test_averaged_curve_equals_window_loop(srs_mg):
+    curves = file_manager.ExportSchema(srs_mg).curve_names
+    pd.testing.assert_frame_equal(analyzer.averaged_curve(srs_mg, curves), loop_averaged_curve(srs_mg, curves))
+
+
+def test_averaged_curve_with_nan_depths(srs_mg):
+    # NaN depths sort last like in sort_values and their windows skip the missing hardness
+    data = srs_mg.copy()
+    schema = file_manager.ExportSchema(data)
+    curves = schema.curve_names[:6]
+    rng = np.random.default_rng(0)
+    for curve in curves:
+        depth = schema.column(curve, 'Pd', 'X')
+        data.loc[rng.choice(len(data), 15, replace=False), depth] = np.nan
+    data.loc[rng.choice(len(data), 15, replace=False), schema.column(curves[0], 'Hardness (H)', 'Y')] = np.nan
+
+    result = analyzer.averaged_curve(data, curves)
+    expected = loop_averaged_curve(data, curves)
+    assert result['x'].isna().sum() > 0
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_averaged_curve_srs_mg_gd(example_file):
+    data = file_manager.txt_to_df(example_file('srs_mg_gd.TXT'))
+    curves = file_manager.ExportSchema(data).curve_names
+    result = analyzer.averaged_curve(data, curves)
+    expected = loop_averaged_curve(data, curves)
+    assert len(curves) == 68
+
+    boundary = SRS_MG_GD_BOUNDARY_WINDOW
+    assert abs(result['mean'][boundary] - expected['mean'][boundary]) == pytest.approx(0.01)
+    pd.testing.assert_frame_equal(result.drop(index=boundary), expected.drop(index=boundary))
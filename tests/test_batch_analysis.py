@@ -0,0 +1,26 @@
+import numpy as np
+
+import batch_analysis
+import srs_uncertainty
+
+
+def test_bootstrap_failure_is_recorded_per_pair(example_file, monkeypatch):
+    def case_intervals(*args, **kwargs):
+        raise np.linalg.LinAlgError("SVD did not converge")
+    monkeypatch.setattr(srs_uncertainty, 'case_intervals', case_intervals)
+
+    rows = batch_analysis.analyze_pair((example_file('HT_V_100mN.TXT'), example_file('HT_V_100mN_data.TXT')))
+    ok_rows = [row for row in rows if row['status'] == 'ok']
+    assert ok_rows
+    for row in ok_rows:
+        assert np.isfinite(row['m']) and np.isnan(row['m_low'])
+        assert row['error'] == "bootstrap failed: numpy.linalg.LinAlgError: SVD did not converge"
+
+
+def test_analyze_pair_intervals(example_file):
+    rows = batch_analysis.analyze_pair((example_file('HT_V_100mN.TXT'), example_file('HT_V_100mN_data.TXT')))
+    ok_rows = [row for row in rows if row['status'] == 'ok']
+    assert ok_rows
+    for row in ok_rows:
+        assert row['error'] == ''
+        assert row['m_low'] <= row['m'] <= row['m_high']
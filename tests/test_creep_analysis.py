@@ -0,0 +1,169 @@
+import math
+
+import numpy as np
+import pytest
+
+import creep_analysis
+import file_manager
+
+
+@pytest.fixture(scope='module')
+def experiment(example_file):
+    return (file_manager.txt_to_df(example_file('HT_V_100mN.TXT'), encoding='cp1252'),
+            file_manager.txt_to_df(example_file('HT_V_100mN_data.TXT'), encoding='cp1252'))
+
+
+@pytest.fixture(scope='module')
+def data_manager(experiment):
+    return creep_analysis.create_data_manager(*experiment)
+
+
+def test_array_kernels_match_scalar_formulas(data_manager):
+    case = data_manager.ok_cases()[0]
+    step_size = creep_analysis.START_STEP_SIZE
+
+    # the per point loops of area_insert, hardness_insert, strain_rate_insert and compute_log
+    area = [creep_analysis.area_calc(pd + case.creep_displacement_start, fn, case.s_value)
+            for pd, fn in zip(case.fitted_creep_displacement, case.creep_load)]
+    sqrt_area = [creep_analysis.sqrt_area_calc(value) for value in area]
+    hardness = [creep_analysis.hardness_calc(fn, value) for fn, value in zip(case.creep_load, area)]
+    strain_rate = [creep_analysis.strain_rate_calc(sqrt_area[i], sqrt_area[i + step_size],
+                                                   case.creep_time[i], case.creep_time[i + step_size])
+                   for i in range(len(case.creep_time) - step_size)]
+    log_strain_rate = [math.log(value) for value in strain_rate]
+    log_hardness = [math.log(hardness[i]) for i in range(len(strain_rate))]
+
+    np.testing.assert_allclose(case.area, area, rtol=1e-12)
+    np.testing.assert_allclose(case.sqrt_area, sqrt_area, rtol=1e-12)
+    np.testing.assert_allclose(case.hardness, hardness, rtol=1e-12)
+    np.testing.assert_allclose(case.strain_rate, strain_rate, rtol=1e-9)
+    np.testing.assert_allclose(case.log_strain_rate, log_strain_rate, rtol=1e-9)
+    np.testing.assert_allclose(case.log_hardness, log_hardness, rtol=1e-12)
+
+
+def loop_creep_start_end_idx(fn, spacing=creep_analysis.HOLD_GRADIENT_SPACING):
+    """the per point search find_hold_segments replaced"""
+    for i in range(len(fn) - spacing):
+        if round((fn[i + spacing] - fn[i]) * 100) == 0:
+            for j in range(i, len(fn) - spacing):
+                if round((fn[j + spacing] - fn[j]) * 10) < 0:
+                    return [i, j]
+            return None
+    return None
+
+
+def trapezoid_load(holds, ramp=200, hold=300, peak=10.0):
+    """load that rises to peak, holds, drops to peak / 2 and so on for every hold, then unloads to zero"""
+    pieces, load = [], 0.0
+    for i in range(holds):
+        target = peak / (i + 1)
+        pieces += [np.linspace(load, target, ramp), np.full(hold, target)]
+        load = target
+    pieces.append(np.linspace(load, 0.0, ramp))
+    return np.concatenate(pieces)
+
+
+@pytest.mark.parametrize('file_name', ['HT_V_100mN.TXT', 'HT_V_300mN.TXT', 'HT_Y_300mN.TXT'])
+def test_hold_detection_matches_loop(example_file, file_name):
+    data = file_manager.txt_to_df(example_file(file_name), encoding='cp1252')
+    for case in creep_analysis.get_exp_case(data):
+        fn = creep_analysis.get_displacement_time_dataframe(data, case)['Fn'].to_numpy()
+        expected = loop_creep_start_end_idx(fn)
+        assert expected is not None
+        assert creep_analysis.find_creep_start_end_idx({'Fn': fn}) == expected
+        assert creep_analysis.find_hold_segments(fn)[0] == tuple(expected)
+
+
+def test_several_holds():
+    fn = trapezoid_load(3)
+    segments = creep_analysis.find_hold_segments(fn)
+    assert len(segments) == 3
+    starts = [start for start, _ in segments]
+    assert np.all(np.diff(starts) > 0)
+    for start, end in segments:
+        # every hold ends where the load starts to drop towards the next one
+        assert np.ptp(fn[start:end]) < 0.01
+        assert fn[end + creep_analysis.HOLD_GRADIENT_SPACING] < fn[end] - 0.05
+    assert segments[0] == tuple(loop_creep_start_end_idx(fn))
+
+
+def test_no_hold():
+    fn = np.concatenate([np.linspace(0, 10, 500), np.linspace(10, 0, 500)])
+    assert creep_analysis.find_hold_segments(fn) == []
+    with pytest.raises(creep_analysis.NoHoldSegmentError):
+        creep_analysis.find_creep_start_end_idx({'Fn': fn})
+
+
+@pytest.mark.parametrize('dtype', [None, np.float32])
+def test_stream_data_manager_matches_in_memory(example_file, experiment, data_manager, monkeypatch, dtype):
+    passes = []
+    iter_curve_chunks = file_manager.iter_curve_chunks
+    monkeypatch.setattr(file_manager, 'iter_curve_chunks', lambda *args, **kwargs: (
+        passes.append(args[0]) or iter_curve_chunks(*args, **kwargs)))
+
+    streamed = creep_analysis.stream_data_manager(example_file('HT_V_100mN.TXT'), experiment[1], batch_cases=2,
+                                                  dtype=dtype)
+    assert len(passes) == 1  # every batch comes from the same pass over the export
+    assert list(streamed) == list(data_manager)
+    m = [case.srs_m for case in streamed.values()]
+    expected = [case.srs_m for case in data_manager.values()]
+    if dtype is None:
+        np.testing.assert_array_equal(m, expected)
+    else:
+        np.testing.assert_allclose(m, expected, rtol=1e-3)
+    for case in streamed.ok_cases():
+        assert case.fn is None and case.creep_load.base is None
+
+
+def power_law_creep(samples=5001, step_size=creep_analysis.START_STEP_SIZE):
+    """sqrt area of h = a t^b + k t under a constant load and the exact strain rate of every interval,
+    (1 / sqrt A(t_i)) d sqrt A / dt in the middle of [t_i, t_i+step]"""
+    a, b, k = 20.0, 0.3, 0.05
+    time = np.linspace(0, 100, samples)
+    depth_offset = 1000.0  # contact depth of the hold start, nm
+
+    def sqrt_area(t):
+        return np.sqrt(2 * np.pi * creep_analysis.TIP_RADIUS * (depth_offset + a * t ** b + k * t) * 1e-9)
+
+    middle = (time[:-step_size] + time[step_size:]) / 2
+    with np.errstate(divide='ignore'):
+        d_sqrt_area = np.pi * creep_analysis.TIP_RADIUS * 1e-9 * (a * b * middle ** (b - 1) + k) / sqrt_area(middle)
+    return time[None], sqrt_area(time)[None], np.array([[a, b, k]]), (d_sqrt_area / sqrt_area(time[:-step_size]))[None]
+
+
+@pytest.mark.parametrize('estimator', creep_analysis.STRAIN_RATE_ESTIMATORS)
+def test_strain_rate_estimators_on_power_law(estimator):
+    time, sqrt_area, constants, expected = power_law_creep()
+    if estimator == 'difference':
+        strain_rate = creep_analysis.strain_rate_difference(sqrt_area, time)
+    elif estimator == 'savgol':
+        strain_rate = creep_analysis.strain_rate_savgol(sqrt_area, time)
+    else:
+        strain_rate = creep_analysis.strain_rate_fitted(sqrt_area, time, constants)
+    # every estimator gives the rate of the interval from each point on, none leaves leading NaN
+    assert strain_rate.shape == expected.shape
+    assert np.all(np.isfinite(strain_rate[:, 1:]))
+    later = time[:, :expected.shape[1]] >= 5  # away from the t^(b - 1) singularity at the hold start
+    # an interval misaligned by step_size / 2 would be about 10% off at t = 5
+    np.testing.assert_allclose(strain_rate[later], expected[later], rtol=1e-2)
+
+
+@pytest.mark.parametrize('estimator', ['difference', 'savgol'])
+def test_adaptive_step_follows_the_reference_noise(estimator):
+    time, sqrt_area, _, expected = power_law_creep()
+    function = getattr(creep_analysis, f"strain_rate_{estimator}")
+    fixed = function(sqrt_area, time)
+    # a smooth reference always accepts the first step
+    np.testing.assert_array_equal(function(sqrt_area, time, adaptive=True), fixed)
+
+    displacement = (sqrt_area ** 2 / 1e-9 / (2 * np.pi * creep_analysis.TIP_RADIUS))
+    noisy = displacement + np.random.default_rng(0).normal(0, 0.2, displacement.shape)
+    adaptive = function(sqrt_area, time, adaptive=True, reference=noisy)
+    assert adaptive.shape == fixed.shape
+    grown = adaptive != fixed
+    # the creep slows down, so the later points need the larger steps
+    assert grown[:, -1000:].mean() > grown[:, :1000].mean()
+    # a grown step averages the decaying rate over a longer interval
+    later = time[:, :expected.shape[1]] >= 5
+    assert np.all(adaptive[later] <= expected[later] * 1.01)
+    np.testing.assert_allclose(adaptive[later], expected[later], rtol=0.15)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+import creep_pipeline
+import file_manager
+
+
+@pytest.fixture(scope='module')
+def experiment(example_file):
+    return (file_manager.txt_to_df(example_file('HT_V_100mN.TXT'), encoding='cp1252'),
+            file_manager.txt_to_df(example_file('HT_V_100mN_data.TXT'), encoding='cp1252'))
+
+
+def test_cache_is_bounded(experiment):
+    pipeline = creep_pipeline.CreepPipeline(*experiment, cache_size=12)
+    expected = {case.name: case.srs_m for case in pipeline.run().values()}
+    for step_size in (2, 3, 4):
+        pipeline.run(step_size=step_size)
+        assert len(pipeline._cache) <= 12
+
+    # the stages of the first run were evicted and are computed again with the same result
+    results = pipeline.run()
+    assert 'raw_data' not in pipeline.computed_stages
+    assert 'strain_rate' in pipeline.computed_stages
+    np.testing.assert_array_equal([case.srs_m for case in results.values()], list(expected.values()))
+
+
+def test_clear(experiment):
+    pipeline = creep_pipeline.CreepPipeline(*experiment)
+    pipeline.run()
+    pipeline.clear()
+    pipeline.run()
+    assert pipeline.computed_stages == list(creep_pipeline.STAGES)
@@ -0,0 +1,24 @@
+import numpy as np
+
+import creep_results
+
+
+def test_save_load_round_trip(tmp_path):
+    results = creep_results.CreepResults(['HT_V_100mN_1', 'HT_V_100mN_2'])
+    fitted, failed = results.values()
+    fitted.fitting_constants = np.array([1.5, 0.25, 0.01])
+    fitted.s_value = np.float64(0.2)
+    fitted.set_array('creep_time', np.linspace(0, 10, 5))
+    failed.fail('creep_data', 'no hold segment')
+
+    results.save(tmp_path / 'results.npz')
+    loaded = creep_results.CreepResults.load(tmp_path / 'results.npz')
+
+    fitted, failed = loaded.values()
+    # constants are stored as a json list and come back as an array like after fitting
+    assert isinstance(fitted.fitting_constants, np.ndarray)
+    np.testing.assert_array_equal(fitted.fitting_constants, [1.5, 0.25, 0.01])
+    assert fitted.s_value == 0.2
+    np.testing.assert_array_equal(fitted.creep_time, np.linspace(0, 10, 5))
+    assert failed.fitting_constants is None
+    assert (failed.failed_stage, failed.error) == ('creep_data', 'no hold segment')
@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+import pytest
+
+import data_cache
+import file_manager
+
+
+@pytest.mark.parametrize('sheet_name', ['data', 'raw data'])
+def test_xlsx_warm_read_matches_cold_read(cache_dir, example_file, sheet_name):
+    # the report sheet mixes text and numbers in one column
+    cold = file_manager.xlsx_to_df(example_file('Spherical_H_100mN.xlsx'), sheet_name)
+    assert len(list(cache_dir.iterdir())) == 1
+    warm = file_manager.xlsx_to_df(example_file('Spherical_H_100mN.xlsx'), sheet_name)
+    pd.testing.assert_frame_equal(cold, warm)
+    if sheet_name == 'data':
+        assert [type(value) for value in warm.iloc[3]] == [type(value) for value in cold.iloc[3]]
+
+
+def test_txt_warm_read_matches_cold_read(cache_dir, example_file):
+    cold = file_manager.txt_to_df(example_file('HT_V_100mN_data.TXT'), encoding='cp1252')
+    warm = file_manager.txt_to_df(example_file('HT_V_100mN_data.TXT'), encoding='cp1252')
+    pd.testing.assert_frame_equal(cold, warm)
+
+
+def test_use_cache_false_writes_nothing(cache_dir, example_file):
+    uncached = file_manager.txt_to_df(example_file('HT_V_100mN_data.TXT'), encoding='cp1252', use_cache=False)
+    assert not cache_dir.exists()
+    cached = file_manager.txt_to_df(example_file('HT_V_100mN_data.TXT'), encoding='cp1252')
+    pd.testing.assert_frame_equal(uncached, cached)
+
+
+def test_prune_cache_removes_least_recently_used(cache_dir, example_file):
+    names = ['HT_V_100mN_data.TXT', 'HT_V_300mN_data.TXT', 'As-built sample data.TXT']
+    entries = {}
+    for name in names:
+        known = set(os.listdir(cache_dir)) if cache_dir.exists() else set()
+        file_manager.txt_to_df(example_file(name), encoding='cp1252')
+        entries[name], = [os.path.join(cache_dir, entry) for entry in set(os.listdir(cache_dir)) - known]
+    for age, entry in enumerate(entries.values()):
+        os.utime(entry, (1000 + age, 1000 + age))  # first read is the oldest
+
+    # a warm read makes the oldest entry the most recently used
+    file_manager.txt_to_df(example_file(names[0]), encoding='cp1252')
+    sizes = {name: sum(f.stat().st_size for f in os.scandir(entry)) for name, entry in entries.items()}
+    data_cache.prune_cache(sizes[names[0]] + sizes[names[2]])
+
+    assert [os.path.isdir(entries[name]) for name in names] == [True, False, True]
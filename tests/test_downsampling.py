@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+import downsampling
+
+
+@pytest.mark.parametrize('length', [1999, 2000, 2001, 2951, 3000, 3999, 4000, 4001, 11000])
+def test_downsample_indices_sizes(length):
+    # 2001-3999 points used to leave the min/max buckets empty
+    x = np.arange(length, dtype=float)
+    y = np.sin(x)
+    idx = downsampling.downsample_indices(x, y)
+    assert len(idx) <= downsampling.DEFAULT_POINTS
+    assert idx[0] == 0 and idx[-1] == length - 1
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_lodline_resample_on_zoom():
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    ax = Figure().add_subplot()
+    x = np.arange(11000, dtype=float)
+    line = downsampling.LODLine(ax, x, np.sin(x / 50))
+    ax.set_xlim(100, 400)
+    shown_x, _ = line.line.get_data()
+    assert np.all((shown_x >= 99) & (shown_x <= 401) | np.isin(shown_x, [0, 10999]))
+
+
+@pytest.mark.parametrize('length', [50000, 103999])
+def test_downsample_indices_spread_along_x(length):
+    # the points after the last full min/max bucket used to be kept unreduced, oversampling the curve end
+    x = np.linspace(0, 1, length)
+    y = np.sin(x * 200)
+    idx = downsampling.downsample_indices(x, y)
+    counts, _ = np.histogram(x[idx], bins=10, range=(0, 1))
+    assert counts.max() - counts.min() <= 0.02 * len(idx)
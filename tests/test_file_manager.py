@@ -0,0 +1,48 @@
+import pytest
+
+import file_manager
+
+
+def scan(data, group, measurement, parameter):
+    """the linear lookup ParameterTable replaced, every matching value"""
+    return data['Value'][(data['Group'] == group) & (data['Parameter'] == parameter)
+                         & (data['Measurement'] == measurement)].values
+
+
+@pytest.fixture(scope='module')
+def stiffness_data(example_file):
+    return file_manager.txt_to_df(example_file('HT_V_100mN_data.TXT'), encoding='cp1252')
+
+
+@pytest.fixture(scope='module')
+def parameter_table(stiffness_data):
+    return file_manager.ParameterTable(stiffness_data)
+
+
+@pytest.mark.parametrize('parameter', ['S (O&P)', 'Er (O&P)', 'HIT (O&P)', 'X', "Poisson's ratio"])
+def test_get_matches_scan(stiffness_data, parameter_table, parameter):
+    pairs = stiffness_data[['Group', 'Measurement']].drop_duplicates().itertuples(index=False)
+    checked = 0
+    for group, measurement in pairs:
+        found = scan(stiffness_data, group, measurement, parameter)
+        if len(found):
+            assert parameter_table.get(group, measurement, parameter) == found[0]
+            checked += 1
+    assert checked > 0
+
+
+def test_short_parameter_names(parameter_table, stiffness_data):
+    group, measurement = stiffness_data[['Group', 'Measurement']].iloc[0]
+    assert parameter_table.get(group, measurement, 'S') == parameter_table.get(group, measurement, 'S (O&P)')
+    series = parameter_table.parameter('HIT', group)
+    for measurement, value in series.items():
+        assert value == scan(stiffness_data, group, measurement, 'HIT (O&P)')[0]
+
+
+def test_missing_parameter(parameter_table, stiffness_data):
+    group, measurement = stiffness_data[['Group', 'Measurement']].iloc[0]
+    assert len(scan(stiffness_data, group, measurement, 'no such parameter')) == 0
+    with pytest.raises(KeyError):
+        parameter_table.get(group, measurement, 'no such parameter')
+    with pytest.raises(KeyError):
+        parameter_table.get('no such group', measurement, 'S (O&P)')
@@ -0,0 +1,38 @@
+import pytest
+
+import file_manager
+import indentation_map
+
+
+@pytest.fixture
+def as_built(example_file):
+    data = file_manager.txt_to_df(example_file('As-built sample data.TXT'), encoding='cp1252')
+    return indentation_map.IndentationMap.from_parameters(data)
+
+
+def test_positions_in_mm_are_converted_to_um(as_built):
+    # the export gives X/Y in mm, read as um all 48 indents would snap into one cell
+    assert len(as_built) == 48
+    assert as_built.x.min() == pytest.approx(4411.0)
+    assert as_built.shape == (29, 29)
+    assert as_built.grid('hardness', 'count').max() == 1
+
+
+@pytest.mark.parametrize('unit, scale', [('mm', 1e3), ('um', 1.0), ('\xb5m', 1.0), ('\u03bcm', 1.0), ('�m', 1.0),
+                                         ('nm', 1e-3), ('cm', 1e4), (' mm ', 1e3)])
+def test_position_scale(unit, scale):
+    assert indentation_map.position_scale(unit) == scale
+
+
+@pytest.mark.parametrize('unit', ['dm', 'km', 'Xm', 'in', 'mmm'])
+def test_unknown_position_unit(unit):
+    # only a garbled micro sign is read as um, not any two letter unit ending in m
+    with pytest.raises(ValueError):
+        indentation_map.position_scale(unit)
+
+
+def test_grain_aggregate_falls_back_to_group(as_built):
+    by_grain = as_built.aggregate('hardness')
+    assert by_grain.index.name == 'group'
+    assert by_grain['count'].sum() == 48
+    assert by_grain.equals(as_built.aggregate('hardness', by='group'))
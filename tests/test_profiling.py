@@ -0,0 +1,28 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in a fresh interpreter, the test session has imported scipy long before
+SCRIPT = """
+import json, sys
+import creep_analysis, file_manager, profiling
+curves = file_manager.txt_to_df(sys.argv[1], encoding='cp1252')
+parameters = file_manager.txt_to_df(sys.argv[2], encoding='cp1252')
+with profiling.profile(memory=False) as profiler:
+    creep_analysis.create_data_manager(curves, parameters)
+print(json.dumps({'/'.join(path): total['time'] for path, total in profiler.totals().items()}))
+"""
+
+
+def test_scipy_import_is_not_timed_as_fitting(example_file):
+    result = subprocess.run([sys.executable, '-c', SCRIPT, example_file('HT_V_100mN.TXT'),
+                             example_file('HT_V_100mN_data.TXT')], cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, 'NANOINDENTATION_CACHE': '0'}, check=True)
+    times = json.loads(result.stdout)
+    assert 'create_data_manager/import' in times
+    assert 'create_data_manager/fitting/import' not in times
+    # the fits of four cases take milliseconds, a cold scipy.optimize import far longer
+    assert times['create_data_manager/fitting'] < times['create_data_manager/import']
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import file_manager
+import spherical_analysis
+
+RADIUS = 10000.0  # nm
+MODULUS = 100.0  # GPa
+
+
+def hertz_loading(zero_depth, zero_load, samples=2000, noise=0.0, seed=0):
+    """depth (nm) and load (mN) of a linear approach up to (h*, P*) followed by hertzian loading"""
+    depth = np.linspace(0, zero_depth + 400, samples)
+    contact = np.clip(depth - zero_depth, 0, None)
+    load = np.where(depth < zero_depth, zero_load * depth / zero_depth,
+                    zero_load + 4 / 3 * MODULUS * 1e-6 * np.sqrt(RADIUS) * contact ** 1.5)
+    return depth, load + np.random.default_rng(seed).normal(0, noise, samples)
+
+
+def test_effective_zero_point_recovers_hertz_fit():
+    points = [(50.0, 0.02), (80.0, 0.03), (30.0, 0.0)]
+    depth, load = map(np.array, zip(*(hertz_loading(*point) for point in points)))
+    zero_depth, zero_load, modulus, rmse = spherical_analysis.effective_zero_point(
+        depth, load, spherical_analysis.loading_end(load), RADIUS)
+    # the approach below P* used to pull P* down to about half
+    np.testing.assert_allclose(zero_depth, [50.0, 80.0, 30.0], atol=0.01)
+    np.testing.assert_allclose(zero_load, [0.02, 0.03, 0.0], atol=1e-4)
+    np.testing.assert_allclose(modulus, MODULUS, rtol=1e-4)
+    assert np.all(rmse < 1e-4)
+
+
+def test_effective_zero_point_with_noise():
+    depth, load = hertz_loading(50.0, 0.02, noise=0.002)
+    zero_depth, zero_load, modulus, _ = spherical_analysis.effective_zero_point(
+        depth[None], load[None], spherical_analysis.loading_end(load[None]), RADIUS)
+    assert zero_depth[0] == pytest.approx(50.0, abs=0.5)
+    assert zero_load[0] == pytest.approx(0.02, abs=0.002)
+    assert modulus[0] == pytest.approx(MODULUS, rel=0.01)
+
+
+def test_contact_radius_is_hertzian_in_the_elastic_range():
+    depth = np.linspace(1, 50, 50)[None]
+    load = 4 / 3 * MODULUS * 1e-6 * np.sqrt(RADIUS) * depth ** 1.5
+    contact = spherical_analysis.contact_radius(depth, load, RADIUS, MODULUS, epsilon=0.75)
+    # hc is about h / 2 for a hertzian contact, so a = sqrt(2 R hc - hc^2) -> sqrt(R h) up to terms of h / R
+    assert np.all(np.abs(contact / np.sqrt(RADIUS * depth) - 1) < depth / RADIUS)
+
+    stress, strain = spherical_analysis.indentation_stress_strain(depth, load, contact)
+    np.testing.assert_allclose(stress, load / (np.pi * contact ** 2) * 1e6)
+    np.testing.assert_allclose(strain, 4 * depth / (3 * np.pi * contact))
+
+
+def test_read_test_constants(example_file):
+    constants = spherical_analysis.read_test_constants(example_file('Spherical_H_100mN.xlsx'))
+    assert list(constants.index) == [4, 6, 7, 8]
+    assert constants.loc[4].tolist() == pytest.approx([96.489, 0.561, 10.0])
+    assert (constants['R'] == 10.0).all()
+
+
+def test_read_xlsx_curves_equal_read_excel(example_file):
+    file_path = example_file('Spherical_H_100mN.xlsx')
+    # a small chunksize crosses many chunk borders, the first one after the header row
+    curves = file_manager.read_xlsx_curves(file_path, spherical_analysis.CURVE_SHEET, chunksize=97)
+    schema = file_manager.ExportSchema(pd.read_excel(file_path, spherical_analysis.CURVE_SHEET))
+    assert curves.curve_names == schema.curve_names
+    for curve in schema.curve_names:
+        for quantity, axis in [('Time', 'X'), ('Fn', 'Y'), ('Pd', 'Y')]:
+            np.testing.assert_array_equal(curves.curve_values(curve, quantity, axis),
+                                          schema.curve_values(curve, quantity, axis))
+
+
+def test_read_xlsx_report_equal_read_excel(example_file):
+    file_path = example_file('Spherical_H_100mN.xlsx')
+    report = file_manager.read_xlsx_report(file_path, spherical_analysis.REPORT_SHEET)
+    sheet = pd.read_excel(file_path, spherical_analysis.REPORT_SHEET, header=None)
+    data_rows = sheet[sheet[1].astype(str).str.startswith('Data :')]
+    np.testing.assert_array_equal(report['Value'], data_rows[2].to_numpy(dtype=float))
+    np.testing.assert_array_equal(report['Measurement'], data_rows[1].str.split(':').str[1].astype(int))
+    assert report['Parameter'].iloc[0] == 'HIT (O&P)' and report['Unit'].iloc[0] == 'GPa'